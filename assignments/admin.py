@@ -1,13 +1,16 @@
 from django.contrib import admin
+from django.db.models import Prefetch
+from django.utils import timezone
 from django.shortcuts import reverse
 from django.utils.html import format_html
 from django.utils.translation import gettext_lazy as _
 from leaflet.admin import LeafletGeoAdmin
 from polymorphic.admin import PolymorphicInlineSupportMixin, StackedPolymorphicInline
+from polymorphic.formsets import BasePolymorphicInlineFormSet
 
 from assignments.forms import AssignmentForm
 from assignments.models import (
-    Assignment, BudgetingTarget, BudgetingTask, OpenTextTask, Section, Task, VoluntarySignupTask
+    Assignment, BudgetingTarget, BudgetingTask, FeedbackSignup, OpenTextTask, Section, Task, VoluntarySignupTask
 )
 
 
@@ -24,6 +27,25 @@ class BudgetingTargetAdmin(admin.ModelAdmin):
     )
 
 
+class TaskInlineFormSet(BasePolymorphicInlineFormSet):
+    """
+    Budgeting task forms share choices of targets, so targets are queried once for all the forms
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.target_choices = None
+        super(TaskInlineFormSet, self).__init__(*args, **kwargs)
+
+    def add_fields(self, form, index):
+        super(TaskInlineFormSet, self).add_fields(form, index)
+        targets = form.fields.get('targets')
+        if targets is None:
+            return
+        if self.target_choices is None:
+            self.target_choices = list(targets.choices)
+        targets.choices = self.target_choices
+
+
 class TaskInline(StackedPolymorphicInline):
     class Media:
         """
@@ -58,6 +80,7 @@ class TaskInline(StackedPolymorphicInline):
         model = VoluntarySignupTask
 
     model = Task
+    formset = TaskInlineFormSet
     child_inlines = (
         OpenTextInline,
         BudgetingTaskInline,
@@ -66,6 +89,11 @@ class TaskInline(StackedPolymorphicInline):
     verbose_name = _('task')
     verbose_name_plural = _('tasks')
 
+    def get_queryset(self, request):
+        # selected targets of all budgeting tasks are fetched at once
+        return super(TaskInline, self).get_queryset(request).prefetch_child_related(
+            BudgetingTask, Prefetch('targets', queryset=BudgetingTask.get_sorted_targets_queryset()))
+
 
 class SectionAdmin(PolymorphicInlineSupportMixin, admin.ModelAdmin):
     extra = 0
@@ -173,3 +201,23 @@ class AssignmentAdmin(LeafletGeoAdmin):
         else:
             inline_instances = orig_inline_instances
         return inline_instances
+
+
+@admin.register(FeedbackSignup)
+class FeedbackSignupAdmin(admin.ModelAdmin):
+    list_display = ['id', 'status', 'attempts', 'next_attempt_at', 'created_at', 'sent_at', 'last_error']
+    list_filter = ('status',)
+    readonly_fields = ['submission', 'data', 'status', 'attempts', 'next_attempt_at', 'last_error', 'created_at',
+                       'sent_at']
+    actions = ['retry']
+
+    def has_add_permission(self, request):
+        return False
+
+    def retry(self, request, queryset):
+        """
+        Send failed signups again
+        """
+        queryset.exclude(status=FeedbackSignup.STATUS_SENT).update(
+            status=FeedbackSignup.STATUS_PENDING, attempts=0, next_attempt_at=timezone.now())
+    retry.short_description = _('Send selected signups again')
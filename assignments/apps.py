@@ -5,3 +5,7 @@ from django.utils.translation import gettext_lazy as _
 class AssignmentsConfig(AppConfig):
     name = 'assignments'
     verbose_name = _('Assignments')
+
+    def ready(self):
+        import assignments.checks  # noqa: F401
+        import assignments.signals  # noqa: F401
@@ -0,0 +1,117 @@
+from decimal import Decimal
+
+from django.db import connection
+from django.db.models import (
+    Aggregate, Avg, Case, Count, F, FloatField, Func, IntegerField, Max, Min, Q, Sum, Value, When
+)
+from django.db.models.functions import Greatest, Least
+
+from assignments.models import REPORT_ANSWERS_CHUNK_SIZE, Assignment, BudgetingTask, get_report_answer_querysets
+
+HISTOGRAM_BINS = 10
+AMOUNT_QUANTUM = Decimal('0.01')
+COMPARISON_AGGREGATES = {
+    'below_reference': Count('id', filter=Q(amount__lt=F('target__reference_amount'))),
+    'above_reference': Count('id', filter=Q(amount__gt=F('target__reference_amount'))),
+    'at_min_amount': Count('id', filter=Q(amount__lte=F('target__min_amount'))),
+    'at_max_amount': Count('id', filter=Q(amount__gte=F('target__max_amount'))),
+}
+# statistics of targets without answers
+EMPTY_STATISTICS = dict({'count': 0, 'histogram': None}, **{name: 0 for name in COMPARISON_AGGREGATES})
+
+
+class Median(Aggregate):
+    """
+    Continuous median of PostgreSQL
+    """
+    function = 'PERCENTILE_CONT'
+    template = '%(function)s(0.5) WITHIN GROUP (ORDER BY %(expressions)s)'
+    output_field = FloatField()
+
+
+def quantize(amount):
+    return None if amount is None else Decimal(str(amount)).quantize(AMOUNT_QUANTUM)
+
+
+def get_histogram_bounds(min_amount, max_amount, largest_amount):
+    """
+    Get bounds of histogram bins of a target, from the minimum amount to the maximum amount of the target,
+    or to the largest answered amount if the target has no maximum
+    """
+    high = largest_amount if max_amount is None else max_amount
+    return min_amount, max(high, min_amount + AMOUNT_QUANTUM)
+
+
+def get_histogram_bin(amount, low, high):
+    # like PostgreSQL width_bucket, with amounts out of the bounds in the first and the last bin
+    return min(max(int((amount - low) * HISTOGRAM_BINS / (high - low)), 0), HISTOGRAM_BINS - 1)
+
+
+def get_budgeting_statistics(slug, school=None, school_class=None):
+    """
+    Get statistics of amounts of budgeting target answers of the assignment filtered by school and class,
+    per budgeting task and target. Medians and histograms are computed in the database on PostgreSQL, and
+    from sorted amounts iterated in chunks on other databases
+    """
+    assignment = Assignment.objects.filter(slug=slug).values('pk')[:1]
+    answers = get_report_answer_querysets(school, school_class, assignment)[BudgetingTask][1].filter(
+        task__section__assignment__slug=slug).order_by()
+    in_database = connection.vendor == 'postgresql'
+    aggregates = dict(COMPARISON_AGGREGATES, count=Count('id'), sum=Sum('amount'), mean=Avg('amount'),
+                      min=Min('amount'), max=Max('amount'))
+    if in_database:
+        aggregates['median'] = Median('amount')
+    statistics = {}
+    for row in answers.values('task', 'target', 'target__min_amount', 'target__max_amount',
+                              'target__reference_amount').annotate(**aggregates):
+        low, high = get_histogram_bounds(row['target__min_amount'], row['target__max_amount'], row['max'])
+        statistics[row['task'], row['target']] = dict(
+            {name: row[name] for name in COMPARISON_AGGREGATES},
+            count=row['count'], sum=quantize(row['sum']), mean=quantize(row['mean']),
+            median=quantize(row.get('median')), min=quantize(row['min']), max=quantize(row['max']),
+            mean_difference_to_reference=quantize(row['mean'] - row['target__reference_amount']),
+            histogram={'min': low, 'max': high, 'counts': [0] * HISTOGRAM_BINS},
+        )
+    if in_database:
+        add_database_histograms(answers, statistics)
+    else:
+        add_sorted_statistics(answers, statistics)
+    return statistics
+
+
+def add_database_histograms(answers, statistics):
+    """
+    Count answers in histogram bins of their targets with width_bucket of PostgreSQL
+    """
+    if not statistics:
+        return
+    bucket = Case(*[
+        When(task=task_id, target=target_id, then=Func(
+            F('amount'), Value(target_statistics['histogram']['min']), Value(target_statistics['histogram']['max']),
+            Value(HISTOGRAM_BINS), function='WIDTH_BUCKET'))
+        for (task_id, target_id), target_statistics in statistics.items()
+    ], output_field=IntegerField())
+    bucket = Least(Greatest(bucket, Value(1)), Value(HISTOGRAM_BINS))
+    for row in answers.annotate(bucket=bucket).values('task', 'target', 'bucket').annotate(count=Count('id')):
+        statistics[row['task'], row['target']]['histogram']['counts'][row['bucket'] - 1] += row['count']
+
+
+def add_sorted_statistics(answers, statistics, chunk_size=REPORT_ANSWERS_CHUNK_SIZE):
+    """
+    Find medians and count answers in histogram bins from amounts iterated in order of task, target and amount,
+    so the amounts are not kept in memory
+    """
+    key = None
+    position = 0
+    amounts = answers.order_by('task_id', 'target_id', 'amount').values_list('task', 'target', 'amount')
+    for task_id, target_id, amount in amounts.iterator(chunk_size=chunk_size):
+        position = position + 1 if key == (task_id, target_id) else 0
+        key = (task_id, target_id)
+        target_statistics = statistics[key]
+        count = target_statistics['count']
+        if position == (count - 1) // 2:
+            target_statistics['median'] = amount
+        if position == count // 2 and count % 2 == 0:
+            target_statistics['median'] = quantize((target_statistics['median'] + amount) / 2)
+        histogram = target_statistics['histogram']
+        histogram['counts'][get_histogram_bin(amount, histogram['min'], histogram['max'])] += 1
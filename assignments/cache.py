@@ -0,0 +1,185 @@
+import gzip
+import hashlib
+import time
+
+import brotli
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+CONTENT_VERSION_KEY = 'assignments:content-version:{slug}'
+CONTENT_MODIFIED_KEY = 'assignments:content-modified:{slug}'
+ANSWERS_VERSION_KEY = 'assignments:answers-version:{slug}'
+CATALOGUE_SLUG = '*'
+REPRESENTATION_KEY = 'assignments:{name}:{slug}:{language}:{version}:{variant}'
+
+IDENTITY = 'identity'
+GZIP = 'gzip'
+BROTLI = 'br'
+# encodings in order of preference
+ENCODINGS = (BROTLI, GZIP, IDENTITY)
+# payloads are compressed on the request missing the cache, e.g. the first report request after a submission
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+def get_initial_version():
+    """
+    Versions start from the current time in milliseconds, so a version key evicted from the cache
+    is never recreated with a value that was already used for a cached payload
+    """
+    return int(time.time() * 1000)
+
+
+def is_stored(slug):
+    """
+    Check if versions of the slug are stored in the cache. They are stored for the catalogue and existing
+    assignments only, so that requests with unknown slugs do not leave keys in the cache
+    """
+    return slug == CATALOGUE_SLUG or apps.get_model('assignments', 'Assignment').objects.filter(slug=slug).exists()
+
+
+def get_version(key, slug):
+    version = cache.get(key)
+    if version is None:
+        version = get_initial_version()
+        if is_stored(slug):
+            cache.add(key, version, timeout=None)
+            version = cache.get(key, version)
+    return version
+
+
+def bump_version(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, get_initial_version(), timeout=None)
+
+
+def get_content_version(slug=None):
+    """
+    Get the current content version of the assignment identified by slug.
+    Without slug, get version of the catalogue which is changed whenever content of any assignment is changed
+    """
+    slug = slug or CATALOGUE_SLUG
+    return get_version(CONTENT_VERSION_KEY.format(slug=slug), slug)
+
+
+def get_content_modified(slug=None):
+    """
+    Get the timestamp of the last content change of the assignment identified by slug.
+    If it is not known anymore, the current time is used
+    """
+    slug = slug or CATALOGUE_SLUG
+    key = CONTENT_MODIFIED_KEY.format(slug=slug)
+    modified = cache.get(key)
+    if modified is None:
+        modified = int(time.time())
+        if is_stored(slug):
+            cache.add(key, modified, timeout=None)
+            modified = cache.get(key, modified)
+    return modified
+
+
+def bump_content_version(*slugs):
+    """
+    Invalidate cached payloads of the assignments identified by slugs and of the catalogue
+    """
+    modified = int(time.time())
+    for slug in set(slugs) | {CATALOGUE_SLUG}:
+        bump_version(CONTENT_VERSION_KEY.format(slug=slug))
+        cache.set(CONTENT_MODIFIED_KEY.format(slug=slug), modified, timeout=None)
+
+
+def get_answers_version(slug):
+    """
+    Get the current version of answers submitted to the assignment identified by slug
+    """
+    return get_version(ANSWERS_VERSION_KEY.format(slug=slug), slug)
+
+
+def bump_answers_version(slug):
+    """
+    Invalidate cached reports of the assignment identified by slug
+    """
+    bump_version(ANSWERS_VERSION_KEY.format(slug=slug))
+
+
+def invalidate_content(slugs):
+    """
+    Bump content versions right away and once more after the transaction is committed, so that a payload
+    cached by a concurrent request between the two still built from old data is not served
+    """
+    slugs = set(slugs)
+    if not slugs:
+        return
+    bump_content_version(*slugs)
+    transaction.on_commit(lambda: bump_content_version(*slugs))
+
+
+def invalidate_answers(slug):
+    """
+    Bump answers version right away and once more after the transaction is committed, see invalidate_content
+    """
+    bump_answers_version(slug)
+    transaction.on_commit(lambda: bump_answers_version(slug))
+
+
+def get_content_etag(version, *variant):
+    """
+    Get strong ETag of the content version represented as given variant, e.g. url, language and media type
+    """
+    value = ':'.join(str(part) for part in (version,) + variant)
+    return '"{}"'.format(hashlib.md5(value.encode('utf-8')).hexdigest())
+
+
+def get_accepted_encoding(accept_encoding):
+    """
+    Get the preferred encoding of the ones accepted in Accept-Encoding header
+    """
+    qualities = {}
+    for coding in accept_encoding.split(','):
+        name, _, params = coding.strip().partition(';')
+        quality = 1.0
+        if params.strip().startswith('q='):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        qualities[name.strip().lower()] = quality
+    for encoding in ENCODINGS:
+        if qualities.get(encoding, qualities.get('*', 0.0)) > 0 or encoding == IDENTITY:
+            return encoding
+
+
+def compress(content):
+    """
+    Get the content in all the supported encodings
+    """
+    return {
+        IDENTITY: content,
+        GZIP: gzip.compress(content, compresslevel=GZIP_LEVEL, mtime=0),
+        BROTLI: brotli.compress(content, quality=BROTLI_QUALITY),
+    }
+
+
+def get_representation_key(name, slug, language, version, query_string=''):
+    variant = hashlib.md5(query_string.encode('utf-8')).hexdigest()
+    return REPRESENTATION_KEY.format(name=name, slug=slug, language=language, version=version, variant=variant)
+
+
+def get_representation(key, encoding):
+    return cache.get('{}:{}'.format(key, encoding))
+
+
+def set_representation(key, content):
+    """
+    Cache the rendered representation compressed in all the supported encodings, return the compressed variants.
+    Variants larger than ASSIGNMENT_CACHE_MAX_SIZE are not cached, the cache would refuse them
+    """
+    variants = compress(content)
+    cache.set_many({'{}:{}'.format(key, encoding): variant for encoding, variant in variants.items()
+                    if len(variant) <= settings.ASSIGNMENT_CACHE_MAX_SIZE},
+                   timeout=settings.ASSIGNMENT_CACHE_TIMEOUT)
+    return variants
@@ -0,0 +1,19 @@
+from django.conf import settings
+from django.core.checks import Error, register
+
+PROCESS_LOCAL_CACHES = ('django.core.cache.backends.locmem.LocMemCache',)
+
+
+@register()
+def check_shared_cache(app_configs, **kwargs):
+    """
+    Content and answer versions, cached payloads and submission limits are kept in the default cache,
+    so every worker must see the same cache outside development
+    """
+    if settings.DEBUG or settings.CACHES['default']['BACKEND'] not in PROCESS_LOCAL_CACHES:
+        return []
+    return [Error(
+        'Default cache is process-local, so workers would serve stale assignments and reports',
+        hint='Set CACHE_URL to a cache shared by the workers, e.g. pymemcache://memcached:11211',
+        id='assignments.E001',
+    )]
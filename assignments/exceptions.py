@@ -5,3 +5,32 @@ from rest_framework.exceptions import APIException
 class FeedbackSystemException(APIException):
     status_code = status.HTTP_400_BAD_REQUEST
     default_detail = 'Feedback system error'
+
+
+class FeedbackSystemUnavailableException(FeedbackSystemException):
+    """
+    Feedback system is failing, so calls are not even tried for a while
+    """
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+
+
+class IdempotencyKeyReusedException(APIException):
+    status_code = status.HTTP_422_UNPROCESSABLE_ENTITY
+    default_detail = 'Idempotency key was already used for a different request'
+
+
+class IdempotencyKeyInProgressException(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'Request with the idempotency key is still being processed'
+
+
+class SubmissionsOverloadedException(APIException):
+    """
+    Too many submissions are processed at once, so the request is rejected instead of waiting for a worker
+    """
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Too many submissions are being processed, try again later'
+
+    def __init__(self, detail=None, code=None, wait=None):
+        super(SubmissionsOverloadedException, self).__init__(detail, code)
+        self.wait = wait
@@ -0,0 +1,73 @@
+import csv
+import io
+
+from openpyxl import Workbook
+from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+
+from assignments.models import REPORT_ANSWERS_CHUNK_SIZE, BudgetingTargetAnswer, OpenTextAnswer
+from assignments.renderers import STREAM_BUFFER_SIZE
+
+OPEN_TEXT_ANSWER = 'open_text'
+BUDGETING_ANSWER = 'budgeting'
+EXPORT_COLUMNS = [
+    'answer_type', 'answer_id', 'submission_id', 'school_id', 'school', 'school_class_id', 'school_class', 'section',
+    'task_id', 'task', 'answer', 'target_id', 'target', 'unit_price', 'amount', 'longitude', 'latitude'
+]
+SUBMISSION_FIELDS = ['id', 'submission_id', 'submission__school_id', 'submission__school__name',
+                     'submission__school_class_id', 'submission__school_class__name', 'task__section__title', 'task_id']
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+
+def get_answer_rows(assignment, school=None, school_class=None, chunk_size=REPORT_ANSWERS_CHUNK_SIZE):
+    """
+    Iterate rows of EXPORT_COLUMNS for every open text and budgeting target answer of the assignment, filtered
+    by school and class. Answers are fetched in chunks as they are iterated
+    """
+    answer_filters = {'task__section__assignment': assignment}
+    if school:
+        answer_filters['submission__school'] = school
+    if school_class:
+        answer_filters['submission__school_class'] = school_class
+    if school or school_class:
+        answer_filters['submission__assignment'] = assignment
+    open_text_answers = OpenTextAnswer.objects.filter(**answer_filters).order_by('id').values_list(
+        *SUBMISSION_FIELDS, 'task__question', 'answer')
+    for row in open_text_answers.iterator(chunk_size=chunk_size):
+        yield (OPEN_TEXT_ANSWER,) + row + (None,) * 6
+    budgeting_answers = BudgetingTargetAnswer.objects.filter(**answer_filters).order_by('id').values_list(
+        *SUBMISSION_FIELDS, 'task__name', 'target_id', 'target__name', 'target__unit_price', 'amount', 'point')
+    for row in budgeting_answers.iterator(chunk_size=chunk_size):
+        point = row[-1]
+        coordinates = point['coordinates'] if isinstance(point, dict) else (None, None)
+        yield (BUDGETING_ANSWER,) + row[:9] + (None,) + row[9:-1] + tuple(coordinates)
+
+
+def iter_csv(rows, buffer_size=STREAM_BUFFER_SIZE):
+    """
+    Write header and rows as CSV in chunks of about `buffer_size` characters
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    for row in rows:
+        writer.writerow(row)
+        if buffer.tell() >= buffer_size:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def write_xlsx(rows, output):
+    """
+    Write header and rows to XLSX file object. Write-only workbook keeps the rows in a temporary file
+    instead of memory
+    """
+    workbook = Workbook(write_only=True)
+    worksheet = workbook.create_sheet('answers')
+    worksheet.append(EXPORT_COLUMNS)
+    for row in rows:
+        # control characters of submitted texts are not allowed in the file
+        worksheet.append([ILLEGAL_CHARACTERS_RE.sub('', value) if isinstance(value, str) else value
+                          for value in row])
+    workbook.save(output)
@@ -0,0 +1,94 @@
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from assignments.exceptions import FeedbackSystemException, FeedbackSystemUnavailableException
+from assignments.helper import post_to_feedback_system
+from assignments.models import FeedbackSignup
+
+logger = logging.getLogger(__name__)
+
+
+def get_retry_delay(attempts):
+    """
+    Get delay before next attempt to send a signup, doubled on every failed attempt
+    """
+    return timedelta(seconds=settings.FEEDBACK_RETRY_DELAY * 2 ** max(attempts - 1, 0))
+
+
+def claim_signups(batch_size):
+    """
+    Get pending signups due for sending. Claimed signups are postponed for the time needed to send them,
+    so concurrent dispatchers skip them, and signups of a crashed dispatcher are sent again later
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        signups = list(FeedbackSignup.objects.select_for_update(skip_locked=True).filter(
+            status=FeedbackSignup.STATUS_PENDING, next_attempt_at__lte=now)[:batch_size])
+        # every send may take the connect and read timeouts, retry delay is a margin for the dispatcher
+        send_timeout = settings.FEEDBACK_CONNECT_TIMEOUT + settings.FEEDBACK_TIMEOUT
+        lease = timedelta(seconds=send_timeout * len(signups)) + get_retry_delay(0)
+        FeedbackSignup.objects.filter(pk__in=[signup.pk for signup in signups]).update(next_attempt_at=now + lease)
+    return signups
+
+
+def release_signups(signups):
+    """
+    Make claimed signups, which were not sent, due for sending again
+    """
+    FeedbackSignup.objects.filter(pk__in=[signup.pk for signup in signups]).update(next_attempt_at=timezone.now())
+
+
+def send_signup(signup):
+    """
+    Post the signup to the feedback system. Failed signup is retried with exponential backoff
+    until maximum number of attempts is reached. Returns True if the signup was sent.
+    If feedback system is known to be failing, FeedbackSystemUnavailableException is raised without
+    counting the attempt
+    """
+    try:
+        post_to_feedback_system(signup.data)
+    except FeedbackSystemUnavailableException:
+        raise
+    except FeedbackSystemException as e:
+        signup.attempts += 1
+        signup.last_error = str(e.detail)
+        if signup.attempts >= settings.FEEDBACK_MAX_ATTEMPTS:
+            signup.status = FeedbackSignup.STATUS_FAILED
+            logger.error('Feedback signup %s failed after %s attempts: %s', signup.pk, signup.attempts,
+                         signup.last_error)
+        else:
+            signup.next_attempt_at = timezone.now() + get_retry_delay(signup.attempts)
+            logger.warning('Feedback signup %s attempt %s failed: %s', signup.pk, signup.attempts, signup.last_error)
+    else:
+        signup.status = FeedbackSignup.STATUS_SENT
+        signup.sent_at = timezone.now()
+        signup.last_error = ''
+    signup.save(update_fields=['status', 'attempts', 'next_attempt_at', 'last_error', 'sent_at'])
+    return signup.status == FeedbackSignup.STATUS_SENT
+
+
+def dispatch_signups(batch_size=100):
+    """
+    Send all pending signups due for sending in batches. Returns numbers of sent and failed signups.
+    Sending is stopped while feedback system is unavailable, and the unsent claimed signups are released
+    to be sent by the next dispatch
+    """
+    sent = failed = 0
+    signups = claim_signups(batch_size)
+    while signups:
+        for index, signup in enumerate(signups):
+            try:
+                if send_signup(signup):
+                    sent += 1
+                else:
+                    failed += 1
+            except FeedbackSystemUnavailableException as e:
+                logger.warning('Sending feedback signups stopped: %s', e.detail)
+                release_signups(signups[index:])
+                return sent, failed
+        signups = claim_signups(batch_size)
+    return sent, failed
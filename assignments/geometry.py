@@ -0,0 +1,53 @@
+import json
+
+from django.contrib.gis.gdal import GDALException
+from django.contrib.gis.geos import GEOSException, GEOSGeometry
+
+# simplification tolerances in degrees of the area resolutions, roughly 100 m, 10 m and 1 m
+AREA_RESOLUTIONS = {
+    'low': 0.001,
+    'medium': 0.0001,
+    'high': 0.00001,
+}
+# full resolution is the area as it was drawn
+FULL_RESOLUTION = 'full'
+# number of decimals coordinates of simplified geometries are rounded to, 6 decimals is about 0.1 m
+COORDINATE_DECIMALS = 6
+
+
+def quantize_coordinates(coordinates, decimals=COORDINATE_DECIMALS):
+    if isinstance(coordinates, (list, tuple)):
+        return [quantize_coordinates(coordinate, decimals) for coordinate in coordinates]
+    return round(coordinates, decimals)
+
+
+def quantize_geometry(geometry, decimals=COORDINATE_DECIMALS):
+    """
+    Round coordinates of GeoJSON geometry to given number of decimals
+    """
+    geometry = dict(geometry)
+    if 'geometries' in geometry:
+        geometry['geometries'] = [quantize_geometry(part, decimals) for part in geometry['geometries']]
+    else:
+        geometry['coordinates'] = quantize_coordinates(geometry['coordinates'], decimals)
+    return geometry
+
+
+def get_area_variants(area):
+    """
+    Get simplified geometries of the area by resolution, bounding box and centroid.
+    If the area is not a valid GeoJSON geometry, there are no variants, bounding box nor centroid
+    """
+    try:
+        geometry = GEOSGeometry(json.dumps(area))
+    except (GDALException, GEOSException, TypeError, ValueError):
+        return {}, None, None
+    if geometry.empty:
+        return {}, None, None
+    variants = {
+        resolution: quantize_geometry(json.loads(geometry.simplify(tolerance, preserve_topology=True).json))
+        for resolution, tolerance in AREA_RESOLUTIONS.items()
+    }
+    bbox = quantize_coordinates(geometry.extent)
+    centroid = quantize_geometry(json.loads(geometry.centroid.json))
+    return variants, bbox, centroid
@@ -1,11 +1,16 @@
 import json
-import urllib.error
+import logging
+import threading
+import time
 import urllib.parse
-import urllib.request
 
+import urllib3
+from django.conf import settings
 from django.utils.translation import gettext_lazy as _
 
-from assignments.exceptions import FeedbackSystemException
+from assignments.exceptions import FeedbackSystemException, FeedbackSystemUnavailableException
+
+logger = logging.getLogger(__name__)
 
 
 def get_description_from_errors(errors):
@@ -20,27 +25,164 @@ def get_description_from_errors(errors):
     return description
 
 
-def post_to_feedback_system(url, data, api_key=None):
-    if api_key:
-        data['api_key'] = api_key
-
-    data = urllib.parse.urlencode(data)
-    data = data.encode('utf-8')
-    try:
-        req = urllib.request.Request(url, data)
-        if api_key:
-            req.add_header('apikey', api_key)
-    except ValueError:
-        raise FeedbackSystemException(_('Feedback system: please check if feedback system url is correctly set'))
+def get_description_from_response(response):
     try:
-        response = urllib.request.urlopen(req)
-    except urllib.error.HTTPError as e:
-        charset = e.info().get_content_charset()
-        content = e.read().decode(charset)
-        errors = json.loads(content)
-        description = get_description_from_errors(errors)
-        raise FeedbackSystemException(_('Feedback system: ') + description)
-    except urllib.error.URLError as e:
-        raise FeedbackSystemException(_('Feedback system: ') + e.reason)
-    else:
+        return get_description_from_errors(json.loads(response.data.decode('utf-8')))
+    except (ValueError, KeyError, TypeError):
+        # error pages of proxies are not feedback system errors
+        return response.reason or str(response.status)
+
+
+class CircuitBreaker(object):
+    """
+    Circuit breaker of remote calls. After `failure_threshold` consecutive failures the circuit opens
+    and calls are rejected without trying, until `reset_timeout` seconds have passed. Then one trial call
+    is let through, which closes the circuit on success or opens it again on failure. If the trial call
+    records neither in `reset_timeout` seconds, another trial call is let through
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self, failure_threshold, reset_timeout):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.lock = threading.Lock()
+
+    def allow(self):
+        with self.lock:
+            if self.state == self.CLOSED:
+                return True
+            now = time.monotonic()
+            # opened_at is the start of the trial call in half-open state
+            if now - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self.opened_at = now
+                return True
+            return False
+
+    def record_success(self):
+        with self.lock:
+            self.state = self.CLOSED
+            self.failures = 0
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+
+class FeedbackSystemClient(object):
+    """
+    Client of the feedback system keeping persistent connections. At most `max_connections` requests
+    are made at once, and calls are short-circuited by circuit breaker while the feedback system is failing.
+    Latency and outcome of every call are logged and counted in `stats`
+    """
+
+    def __init__(self, url, api_key=None, connect_timeout=None, read_timeout=None, max_connections=4,
+                 failure_threshold=5, reset_timeout=30):
+        self.url = url
+        self.api_key = api_key
+        self.timeout = urllib3.Timeout(connect=connect_timeout, read=read_timeout)
+        self.pool = urllib3.PoolManager(maxsize=max_connections, block=True, retries=False, timeout=self.timeout)
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.stats = {'calls': 0, 'failures': 0, 'rejected': 0, 'total_latency': 0.0, 'max_latency': 0.0}
+        self.stats_lock = threading.Lock()
+
+    def record_call(self, latency, outcome):
+        with self.stats_lock:
+            self.stats['calls'] += 1
+            self.stats['total_latency'] += latency
+            self.stats['max_latency'] = max(self.stats['max_latency'], latency)
+            if outcome != 'success':
+                self.stats['failures'] += 1
+        logger.info('Feedback system call %s in %.3f s', outcome, latency,
+                    extra={'feedback_latency': latency, 'feedback_outcome': outcome})
+
+    def request(self, data):
+        headers = {'Content-Type': 'application/x-www-form-urlencoded'}
+        if self.api_key:
+            data = dict(data, api_key=self.api_key)
+            headers['apikey'] = self.api_key
+        try:
+            return self.pool.request('POST', self.url, body=urllib.parse.urlencode(data), headers=headers,
+                                     pool_timeout=self.timeout.read_timeout)
+        except urllib3.exceptions.LocationValueError:
+            raise FeedbackSystemException(
+                _('Feedback system: please check if feedback system url is correctly set'))
+        except urllib3.exceptions.EmptyPoolError:
+            raise FeedbackSystemException(_('Feedback system: ') + _('too many concurrent requests'))
+
+    def post(self, data):
+        """
+        Post the data to the feedback system, returning reason of the response. Errors of the feedback system,
+        and timeouts raise FeedbackSystemException, calls rejected by open circuit FeedbackSystemUnavailableException
+        """
+        if not self.breaker.allow():
+            with self.stats_lock:
+                self.stats['rejected'] += 1
+            raise FeedbackSystemUnavailableException(
+                _('Feedback system: ') + _('service is unavailable, try again later'))
+        start = time.monotonic()
+        try:
+            response = self.request(data)
+        except urllib3.exceptions.HTTPError as e:
+            self.breaker.record_failure()
+            # refused connection is a subclass of connect timeout
+            if isinstance(e, urllib3.exceptions.TimeoutError) and not isinstance(
+                    e, urllib3.exceptions.NewConnectionError):
+                self.record_call(time.monotonic() - start, 'timeout')
+                raise FeedbackSystemException(_('Feedback system: ') + _('request timed out'))
+            self.record_call(time.monotonic() - start, 'error')
+            raise FeedbackSystemException(_('Feedback system: ') + str(e))
+        except BaseException:
+            # e.g. invalid url or exhausted pool, a failed trial call must not leave the circuit half-open
+            self.breaker.record_failure()
+            self.record_call(time.monotonic() - start, 'error')
+            raise
+        if response.status >= 500:
+            self.breaker.record_failure()
+        else:
+            # feedback system is working even if it rejects the data
+            self.breaker.record_success()
+        if response.status >= 400:
+            self.record_call(time.monotonic() - start, 'rejected' if response.status < 500 else 'error')
+            raise FeedbackSystemException(_('Feedback system: ') + get_description_from_response(response))
+        self.record_call(time.monotonic() - start, 'success')
         return response.reason
+
+
+_client_lock = threading.Lock()
+_client = None
+_client_options = None
+
+
+def get_feedback_system_client():
+    """
+    Get client of the feedback system configured in settings. Every worker process reuses one client,
+    so connections are kept open between calls
+    """
+    global _client, _client_options
+    options = {
+        'url': settings.FEEDBACK_SYSTEM_URL,
+        'api_key': settings.FEEDBACK_API_KEY,
+        'connect_timeout': settings.FEEDBACK_CONNECT_TIMEOUT,
+        'read_timeout': settings.FEEDBACK_TIMEOUT,
+        'max_connections': settings.FEEDBACK_MAX_CONNECTIONS,
+        'failure_threshold': settings.FEEDBACK_FAILURE_THRESHOLD,
+        'reset_timeout': settings.FEEDBACK_RESET_TIMEOUT,
+    }
+    with _client_lock:
+        if _client is None or _client_options != options:
+            _client = FeedbackSystemClient(**options)
+            _client_options = options
+        return _client
+
+
+def post_to_feedback_system(data):
+    return get_feedback_system_client().post(data)
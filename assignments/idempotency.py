@@ -0,0 +1,61 @@
+import hashlib
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from assignments.models import IdempotencyKey
+
+
+def get_request_fingerprint(request):
+    """
+    Get hash of the parsed request data, so a key reused for different data can be detected
+    """
+    data = json.dumps(request.data, sort_keys=True, default=str)
+    return hashlib.sha256('{} {}'.format(request.method, data).encode('utf-8')).hexdigest()
+
+
+def claim_key(key, path, fingerprint):
+    """
+    Get the record of the key, or create it for the current request if the key is new or expired.
+    Returns the record and whether it was created. Creating waits until a concurrent request
+    with the same key is committed or rolled back
+    """
+    while True:
+        try:
+            with transaction.atomic():
+                record = IdempotencyKey.objects.create(
+                    key=key, path=path, fingerprint=fingerprint,
+                    expires_at=timezone.now() + timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL))
+            return record, True
+        except IntegrityError:
+            record = IdempotencyKey.objects.filter(key=key, path=path).first()
+        if record is None:
+            # concurrent request was rolled back
+            continue
+        if record.expires_at <= timezone.now():
+            record.delete()
+            continue
+        return record, False
+
+
+def store_response(record, response):
+    """
+    Store successful response of the request for replays. Failed requests can be repeated with the same key
+    """
+    if response.status_code >= 400:
+        record.delete()
+        return
+    record.status_code = response.status_code
+    record.response = response.data
+    record.save(update_fields=['status_code', 'response'])
+
+
+def delete_expired_keys():
+    """
+    Delete expired keys, returning number of deleted keys
+    """
+    deleted, _ = IdempotencyKey.objects.filter(expires_at__lte=timezone.now()).delete()
+    return deleted
@@ -0,0 +1,131 @@
+import io
+import json
+import logging
+from collections import Counter, OrderedDict
+
+from django.conf import settings
+from django.db import DatabaseError, connection, transaction
+
+from assignments.cache import invalidate_answers
+from assignments.models import (
+    BudgetingTargetAnswer, FeedbackSignup, OpenTextAnswer, QueuedSubmission, Submission, SubmissionCounter,
+    get_answer_references
+)
+
+logger = logging.getLogger(__name__)
+
+OPEN_TEXT_ANSWER_FIELDS = ('submission_id', 'task_id', 'answer')
+BUDGETING_TARGET_ANSWER_FIELDS = ('submission_id', 'task_id', 'target_id', 'amount', 'point')
+
+
+def get_copy_value(value):
+    """
+    Format the value for the text format of PostgreSQL COPY
+    """
+    if value is None:
+        return '\\N'
+    if isinstance(value, dict):
+        value = json.dumps(value)
+    return str(value).replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+
+def copy_rows(model, fields, rows):
+    """
+    Insert rows of field values with PostgreSQL COPY
+    """
+    quote_name = connection.ops.quote_name
+    columns = [quote_name(model._meta.get_field(field).column) for field in fields]
+    sql = 'COPY {} ({}) FROM STDIN'.format(quote_name(model._meta.db_table), ', '.join(columns))
+    data = ''.join('\t'.join(get_copy_value(value) for value in row) + '\n' for row in rows)
+    with connection.cursor() as cursor:
+        raw_cursor = cursor.cursor
+        if hasattr(raw_cursor, 'copy_expert'):
+            # psycopg2
+            raw_cursor.copy_expert(sql, io.StringIO(data))
+        else:
+            with raw_cursor.copy(sql) as copy:
+                copy.write(data)
+
+
+def insert_rows(model, fields, rows):
+    """
+    Insert rows of field values at once, copying them on PostgreSQL
+    """
+    if not rows:
+        return
+    if connection.vendor == 'postgresql':
+        copy_rows(model, fields, rows)
+    else:
+        model.objects.bulk_create([model(**dict(zip(fields, row))) for row in rows])
+
+
+def ingest_submissions(slug, submissions):
+    """
+    Save validated submissions of the assignment with their answers and voluntary signups using one insert per table.
+    Submissions are given as dicts with `school_id`, `school_class_id`, `open_text_tasks`, `budgeting_targets`
+    and `voluntary_tasks`. Returns the created submissions
+    """
+    assignment_id = get_answer_references(slug).assignment_id
+    instances = Submission.objects.bulk_create([
+        Submission(assignment_id=assignment_id, school_id=data['school_id'], school_class_id=data['school_class_id'])
+        for data in submissions])
+    SubmissionCounter.increment(assignment_id, Counter(
+        (data['school_id'], data['school_class_id']) for data in submissions))
+    default_amount = BudgetingTargetAnswer._meta.get_field('amount').get_default()
+    insert_rows(OpenTextAnswer, OPEN_TEXT_ANSWER_FIELDS, [
+        (instance.pk, answer['task_id'], answer['answer'])
+        for instance, data in zip(instances, submissions) for answer in data.get('open_text_tasks') or []])
+    insert_rows(BudgetingTargetAnswer, BUDGETING_TARGET_ANSWER_FIELDS, [
+        (instance.pk, answer['task_id'], answer['target_id'], answer.get('amount', default_amount), answer.get('point'))
+        for instance, data in zip(instances, submissions) for answer in data.get('budgeting_targets') or []])
+    # signups are sent to the feedback system by dispatch_feedback_signups command
+    FeedbackSignup.objects.bulk_create([
+        FeedbackSignup(submission=instance, data=voluntary_data)
+        for instance, data in zip(instances, submissions) for voluntary_data in data.get('voluntary_tasks') or []])
+    invalidate_answers(slug)
+    return instances
+
+
+def save_submissions(slug, submissions):
+    """
+    Save validated submissions of the assignment, or queue them to be saved in batches if SUBMISSION_QUEUE setting
+    is enabled. Returns the created submissions, or None if the submissions were queued
+    """
+    if settings.SUBMISSION_QUEUE:
+        QueuedSubmission.objects.bulk_create([QueuedSubmission(slug=slug, data=data) for data in submissions])
+        return None
+    return ingest_submissions(slug, submissions)
+
+
+def flush_queued(slug, queued):
+    """
+    Save queued submissions of the assignment at once. If that fails, submissions are saved one by one,
+    leaving the failing ones in the queue with the error. Returns number of saved submissions
+    """
+    try:
+        with transaction.atomic():
+            ingest_submissions(slug, [item.data for item in queued])
+        return len(queued)
+    except DatabaseError as e:
+        if len(queued) > 1:
+            return sum(flush_queued(slug, [item]) for item in queued)
+        logger.exception('Queued submission %s could not be saved', queued[0].pk)
+        queued[0].last_error = str(e)
+        queued[0].save(update_fields=['last_error'])
+        return 0
+
+
+def flush_queue(batch_size=500):
+    """
+    Save a batch of queued submissions in one transaction, removing them from the queue.
+    Concurrent flushers skip the submissions being saved. Returns numbers of saved and failed submissions
+    """
+    with transaction.atomic():
+        queued = list(QueuedSubmission.objects.select_for_update(skip_locked=True).filter(
+            last_error='')[:batch_size])
+        by_slug = OrderedDict()
+        for item in queued:
+            by_slug.setdefault(item.slug, []).append(item)
+        saved = sum(flush_queued(slug, items) for slug, items in by_slug.items())
+        QueuedSubmission.objects.filter(pk__in=[item.pk for item in queued if not item.last_error]).delete()
+    return saved, len(queued) - saved
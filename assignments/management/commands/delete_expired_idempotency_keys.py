@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+
+from assignments.idempotency import delete_expired_keys
+
+
+class Command(BaseCommand):
+    help = 'Delete idempotency keys of submissions after their expiry'
+
+    def handle(self, *args, **options):
+        self.stdout.write('Deleted {} expired idempotency keys'.format(delete_expired_keys()))
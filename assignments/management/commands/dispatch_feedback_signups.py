@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from assignments.feedback import dispatch_signups
+from assignments.helper import get_feedback_system_client
+
+
+class Command(BaseCommand):
+    help = 'Send pending voluntary signups to the feedback system'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100,
+                            help='Number of signups claimed for sending at once')
+        parser.add_argument('--loop', action='store_true',
+                            help='Keep sending signups until interrupted')
+        parser.add_argument('--interval', type=float, default=10,
+                            help='Seconds to wait for new signups when running in a loop')
+
+    def handle(self, *args, **options):
+        while True:
+            sent, failed = dispatch_signups(options['batch_size'])
+            if sent or failed:
+                self.stdout.write('Sent {} signups, {} attempts failed'.format(sent, failed))
+                if options['verbosity'] > 1:
+                    stats = get_feedback_system_client().stats
+                    self.stdout.write('Feedback system calls: {calls}, failed: {failures}, rejected: {rejected}, '
+                                      'total latency: {total_latency:.3f} s, max latency: {max_latency:.3f} s'.format(
+                                          **stats))
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from assignments.export import get_answer_rows, iter_csv, write_xlsx
+from assignments.models import Assignment
+
+
+class Command(BaseCommand):
+    help = 'Export answers of the assignment with their school, class, task and target as CSV or XLSX file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('slug', help='Slug of the assignment')
+        parser.add_argument('output', help='Path of the exported file')
+        parser.add_argument('--format', choices=['csv', 'xlsx'], default=None,
+                            help='Format of the file, defaults to the extension of the output path or csv')
+        parser.add_argument('--school', type=int, help='Export only answers of the school with the DB id')
+        parser.add_argument('--school-class', type=int, help='Export only answers of the class with the DB id')
+
+    def handle(self, *args, **options):
+        try:
+            assignment = Assignment.objects.get(slug=options['slug'])
+        except Assignment.DoesNotExist:
+            raise CommandError('Assignment "{}" does not exist'.format(options['slug']))
+        file_format = options['format'] or ('xlsx' if options['output'].endswith('.xlsx') else 'csv')
+        rows = get_answer_rows(assignment, options['school'], options['school_class'])
+        if file_format == 'xlsx':
+            with open(options['output'], 'wb') as output:
+                write_xlsx(rows, output)
+        else:
+            with open(options['output'], 'w', newline='', encoding='utf-8') as output:
+                output.writelines(iter_csv(rows))
@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from assignments.ingestion import flush_queue
+
+
+class Command(BaseCommand):
+    help = 'Save queued submissions in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Number of submissions saved in one transaction')
+        parser.add_argument('--loop', action='store_true',
+                            help='Keep saving submissions until interrupted')
+        parser.add_argument('--interval', type=float, default=0.01,
+                            help='Seconds to wait for new submissions when running in a loop')
+
+    def handle(self, *args, **options):
+        while True:
+            saved, failed = flush_queue(options['batch_size'])
+            if saved and options['verbosity'] > 1:
+                self.stdout.write('Saved {} queued submissions'.format(saved))
+            if failed:
+                self.stderr.write('{} queued submissions could not be saved'.format(failed))
+            if saved + failed == options['batch_size']:
+                # more submissions are probably waiting
+                continue
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from assignments.models import SubmissionCounter
+
+
+class Command(BaseCommand):
+    help = 'Count submissions of every assignment, school and class again from the submitted answers'
+
+    def handle(self, *args, **options):
+        counters = SubmissionCounter.rebuild()
+        self.stdout.write('Counted {} submissions in {} counters'.format(
+            sum(counter.count for counter in counters), len(counters)))
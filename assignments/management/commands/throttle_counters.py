@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from assignments.throttling import get_throttled_counts, reset_throttled_counts
+
+
+class Command(BaseCommand):
+    help = 'Show numbers of submission requests rejected by rate limits and concurrency limit'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='Reset the counters after showing them')
+
+    def handle(self, *args, **options):
+        for scope, count in sorted(get_throttled_counts().items()):
+            self.stdout.write('{}: {}'.format(scope, count))
+        if options['reset']:
+            reset_throttled_counts()
@@ -0,0 +1,39 @@
+# Generated by Django 5.0.3 on 2026-10-18 15:02
+
+import djgeojson.fields
+from django.db import migrations, models
+
+from assignments.geometry import get_area_variants
+
+
+def compute_area_variants(apps, schema_editor):
+    Assignment = apps.get_model('assignments', 'Assignment')
+    for assignment in Assignment.objects.all():
+        assignment.area_variants, assignment.area_bbox, assignment.area_centroid = get_area_variants(assignment.area)
+        assignment.save(update_fields=['area_variants', 'area_bbox', 'area_centroid'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('assignments', '0015_upgrade_django_v5'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='assignment',
+            name='area_bbox',
+            field=models.JSONField(blank=True, editable=False, help_text='Bounding box of the area as [min x, min y, max x, max y]', null=True, verbose_name='area bounding box'),
+        ),
+        migrations.AddField(
+            model_name='assignment',
+            name='area_centroid',
+            field=djgeojson.fields.PointField(blank=True, editable=False, help_text='Centroid of the area', null=True, verbose_name='area centroid'),
+        ),
+        migrations.AddField(
+            model_name='assignment',
+            name='area_variants',
+            field=models.JSONField(blank=True, default=dict, editable=False, help_text='Simplified area geometries by resolution', verbose_name='area variants'),
+        ),
+        migrations.RunPython(compute_area_variants, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.0.3 on 2026-10-18 15:18
+
+import django.core.serializers.json
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('assignments', '0016_area_variants'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FeedbackSignup',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data', models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder, help_text='Data posted to the feedback system', verbose_name='data')),
+                ('status', models.IntegerField(choices=[(0, 'Pending'), (1, 'Sent'), (2, 'Failed')], default=0, verbose_name='status')),
+                ('attempts', models.IntegerField(default=0, help_text='Number of failed sending attempts', verbose_name='attempts')),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='next attempt at')),
+                ('last_error', models.TextField(blank=True, verbose_name='last error')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='created at')),
+                ('sent_at', models.DateTimeField(blank=True, null=True, verbose_name='sent at')),
+                ('submission', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feedback_signups', to='assignments.submission')),
+            ],
+            options={
+                'verbose_name': 'feedback signup',
+                'verbose_name_plural': 'feedback signups',
+                'ordering': ['next_attempt_at'],
+                'indexes': [models.Index(fields=['status', 'next_attempt_at'], name='assignments_status_1e4056_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.0.3 on 2026-10-18 15:27
+
+import django.core.serializers.json
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('assignments', '0017_feedback_signup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IdempotencyKey',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=255, verbose_name='key')),
+                ('path', models.CharField(max_length=255, verbose_name='path')),
+                ('fingerprint', models.CharField(help_text='Hash of the request data', max_length=64, verbose_name='fingerprint')),
+                ('status_code', models.PositiveSmallIntegerField(null=True, verbose_name='status code')),
+                ('response', models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder, null=True, verbose_name='response')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='created at')),
+                ('expires_at', models.DateTimeField(db_index=True, verbose_name='expires at')),
+            ],
+            options={
+                'verbose_name': 'idempotency key',
+                'verbose_name_plural': 'idempotency keys',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='idempotencykey',
+            constraint=models.UniqueConstraint(fields=('key', 'path'), name='unique_idempotency_key_path'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.0.3 on 2026-10-18 15:29
+
+import django.core.serializers.json
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('assignments', '0018_idempotency_key'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QueuedSubmission',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('slug', models.SlugField(max_length=80, verbose_name='assignment slug')),
+                ('data', models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder, verbose_name='data')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='created at')),
+                ('last_error', models.TextField(blank=True, verbose_name='last error')),
+            ],
+            options={
+                'verbose_name': 'queued submission',
+                'verbose_name_plural': 'queued submissions',
+                'ordering': ['id'],
+            },
+        ),
+    ]
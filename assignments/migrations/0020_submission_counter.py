@@ -0,0 +1,45 @@
+# Generated by Django 5.0.3 on 2026-10-18 15:33
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def count_submissions(apps, schema_editor):
+    Assignment = apps.get_model('assignments', 'Assignment')
+    Submission = apps.get_model('assignments', 'Submission')
+    SubmissionCounter = apps.get_model('assignments', 'SubmissionCounter')
+    counters = []
+    for assignment_id in Assignment.objects.values_list('id', flat=True):
+        counts = Submission.objects.filter(
+            models.Q(open_text_answers__task__section__assignment=assignment_id) |
+            models.Q(budgeting_answers__task__section__assignment=assignment_id)
+        ).values_list('school', 'school_class').annotate(count=models.Count('id', distinct=True)).order_by()
+        counters.extend(SubmissionCounter(assignment_id=assignment_id, school_id=school_id,
+                                          school_class_id=school_class_id, count=count)
+                        for school_id, school_class_id, count in counts)
+    SubmissionCounter.objects.bulk_create(counters)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('assignments', '0019_queued_submission'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SubmissionCounter',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('assignment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='submission_counters', to='assignments.assignment')),
+                ('school', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='submission_counters', to='assignments.school')),
+                ('school_class', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='submission_counters', to='assignments.schoolclass')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='submissioncounter',
+            constraint=models.UniqueConstraint(fields=('assignment', 'school', 'school_class'), name='unique_submission_counter'),
+        ),
+        migrations.RunPython(count_submissions, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.0.3 on 2026-10-18 15:38
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def link_submissions(apps, schema_editor):
+    Assignment = apps.get_model('assignments', 'Assignment')
+    Submission = apps.get_model('assignments', 'Submission')
+    for assignment_id in Assignment.objects.values_list('id', flat=True):
+        Submission.objects.filter(assignment__isnull=True).filter(
+            models.Q(open_text_answers__task__section__assignment=assignment_id) |
+            models.Q(budgeting_answers__task__section__assignment=assignment_id)
+        ).update(assignment=assignment_id)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('assignments', '0020_submission_counter'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='submission',
+            name='assignment',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='%(class)ss', to='assignments.assignment'),
+        ),
+        migrations.RunPython(link_submissions, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='submission',
+            index=models.Index(fields=['assignment', 'school', 'school_class'], name='assignments_assignm_bca5f8_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='submission',
+            index=models.Index(fields=['assignment', 'school_class'], name='assignments_assignm_3d6348_idx'),
+        ),
+    ]
@@ -1,11 +1,90 @@
+import functools
+
 from django_ckeditor_5.fields import CKEditor5Field
 from django.conf import settings
-from django.db import models
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, models, transaction
+from django.db.models import Prefetch, prefetch_related_objects
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from djgeojson.fields import GeometryField, PointField
+from polymorphic.managers import PolymorphicManager
 from polymorphic.models import PolymorphicModel
+from polymorphic.query import PolymorphicQuerySet
 
+from assignments.cache import get_content_version
 from assignments.fields import SortedAsSelectedManyToManyField
+from assignments.geometry import get_area_variants
+
+# number of assignments whose answer references are cached by every worker
+ANSWER_REFERENCES_CACHE_SIZE = 128
+# number of answers fetched at once when streaming reports
+REPORT_ANSWERS_CHUNK_SIZE = 1000
+
+
+class AssignmentQuerySet(models.QuerySet):
+    def with_content(self, sections=True, tasks=True, targets=True, schools=True, classes=True):
+        """
+        Prefetch sections with their tasks, budgeting targets and schools with their classes,
+        so serializing assignments takes a fixed number of queries. Relations which are not
+        going to be serialized can be left out
+        """
+        lookups = []
+        if sections:
+            section_lookups = []
+            if tasks:
+                task_queryset = Task.objects.all()
+                if targets:
+                    task_queryset = task_queryset.prefetch_child_related(
+                        BudgetingTask, Prefetch('targets', queryset=BudgetingTask.get_sorted_targets_queryset()))
+                section_lookups.append(Prefetch('tasks', queryset=task_queryset))
+            lookups.append(Prefetch('sections', queryset=Section.objects.prefetch_related(*section_lookups)))
+        if schools:
+            school_queryset = School.objects.prefetch_related('classes') if classes else School.objects.all()
+            lookups.append(Prefetch('schools', queryset=school_queryset))
+        return self.prefetch_related(*lookups)
+
+    def with_report(self, school=None, school_class=None, answers=True, statistics=False, assignment=None):
+        """
+        Prefetch sections with their open text and budgeting tasks, and answers of the tasks filtered by school
+        and class to `report_answers` of every task, so the report takes a fixed number of queries.
+        Filtered answers are looked up through submissions of `assignment`, see get_report_answer_querysets.
+        Without `answers`, answers are left to be iterated with `Assignment.iterate_report_answers`.
+        With `statistics`, targets of budgeting tasks are prefetched instead of their answers
+        """
+        task_queryset = Task.objects.instance_of(OpenTextTask, BudgetingTask)
+        if statistics:
+            task_queryset = task_queryset.prefetch_child_related(
+                BudgetingTask, Prefetch('targets', queryset=BudgetingTask.get_sorted_targets_queryset()))
+        if answers:
+            for model, (lookup, answer_queryset) in get_report_answer_querysets(
+                    school, school_class, assignment).items():
+                if statistics and model is BudgetingTask:
+                    continue
+                task_queryset = task_queryset.prefetch_child_related(
+                    model, Prefetch(lookup, queryset=answer_queryset, to_attr='report_answers'))
+        return self.prefetch_related(
+            Prefetch('sections', queryset=Section.objects.prefetch_related(Prefetch('tasks', queryset=task_queryset))))
+
+
+def get_report_answer_querysets(school=None, school_class=None, assignment=None):
+    """
+    Get related name and queryset of answers of open text and budgeting tasks in report filtered by school and class.
+    Filtered answers are restricted to submissions of the assignment, given as instance, id or queryset of its id,
+    so the submissions are found with the indexes on assignment, school and class
+    """
+    answer_filters = {}
+    if school:
+        answer_filters['submission__school'] = school
+    if school_class:
+        answer_filters['submission__school_class'] = school_class
+    if answer_filters and assignment is not None:
+        answer_filters['submission__assignment'] = assignment
+    return {
+        OpenTextTask: ('open_text_answers', OpenTextAnswer.objects.filter(**answer_filters).order_by('id')),
+        BudgetingTask: ('budgeting_answers',
+                        BudgetingTargetAnswer.objects.filter(**answer_filters).select_related('target').order_by('id')),
+    }
 
 
 class Assignment(models.Model):
@@ -29,6 +108,12 @@ class Assignment(models.Model):
     image = models.ImageField(_('image'), upload_to='assignment/image/',
                               blank=True, null=True, help_text=_('Main image of the landing section'))
     area = GeometryField(_('area'), help_text=_('Select the map area for the assignment'))
+    area_variants = models.JSONField(_('area variants'), default=dict, blank=True, editable=False,
+                                     help_text=_('Simplified area geometries by resolution'))
+    area_bbox = models.JSONField(_('area bounding box'), null=True, blank=True, editable=False,
+                                 help_text=_('Bounding box of the area as [min x, min y, max x, max y]'))
+    area_centroid = PointField(_('area centroid'), null=True, blank=True, editable=False,
+                               help_text=_('Centroid of the area'))
     status = models.IntegerField(_('status'), choices=STATUS_CHOICES, default=STATUS_OPEN,
                                  help_text=_(
                                      'Status of the assignment. Only opened assignments are presented to the users'))
@@ -38,6 +123,8 @@ class Assignment(models.Model):
                                      help_text=_('Schools that are participating in the assignment<br>'))
     slug = models.SlugField(max_length=80, unique=True)
 
+    objects = AssignmentQuerySet.as_manager()
+
     class Meta:
         verbose_name = _('Assignment')
         verbose_name_plural = _('Assignments')
@@ -48,16 +135,21 @@ class Assignment(models.Model):
     def get_absolute_url(self):
         return '{}/{}/'.format(settings.FRONTEND_APP_URL, self.slug)
 
-    def get_submissions(self, school=None, school_class=None):
+    def save(self, *args, **kwargs):
+        self.area_variants, self.area_bbox, self.area_centroid = get_area_variants(self.area)
+        super(Assignment, self).save(*args, **kwargs)
+
+    def iterate_report_answers(self, school=None, school_class=None, chunk_size=REPORT_ANSWERS_CHUNK_SIZE):
         """
-        Get all submissions related to the assignment filtered by school or school_class if given.
+        Set iterators over answers filtered by school and class to `report_answers` of every task of the assignment
+        fetched with `with_report(answers=False)`. Answers are fetched in chunks as they are iterated, with server
+        side cursors unless DISABLE_SERVER_SIDE_CURSORS is set
         """
-        submissions = Submission.objects.all()
-        if school:
-            submissions = submissions.filter(school=school)
-        if school_class:
-            submissions = submissions.filter(school_class=school_class)
-        return submissions
+        answer_querysets = get_report_answer_querysets(school, school_class, self)
+        for section in self.sections.all():
+            for task in section.tasks.all():
+                answer_queryset = answer_querysets[type(task)][1]
+                task.report_answers = answer_queryset.filter(task=task).iterator(chunk_size=chunk_size)
 
 
 class Section(models.Model):
@@ -82,6 +174,38 @@ class Section(models.Model):
         return self.title
 
 
+class TaskQuerySet(PolymorphicQuerySet):
+    """
+    Polymorphic queryset which can prefetch relations defined only on some of the task types
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(TaskQuerySet, self).__init__(*args, **kwargs)
+        self._child_prefetch_lookups = {}
+        self._child_prefetch_done = False
+
+    def _clone(self, *args, **kwargs):
+        new = super(TaskQuerySet, self)._clone(*args, **kwargs)
+        new._child_prefetch_lookups = dict(self._child_prefetch_lookups)
+        return new
+
+    def prefetch_child_related(self, model, *lookups):
+        """
+        Prefetch lookups on fetched tasks of the given type only, e.g. targets of budgeting tasks
+        """
+        clone = self._chain()
+        clone._child_prefetch_lookups[model] = clone._child_prefetch_lookups.get(model, ()) + lookups
+        return clone
+
+    def _fetch_all(self):
+        super(TaskQuerySet, self)._fetch_all()
+        if self._child_prefetch_lookups and not self._child_prefetch_done:
+            for model, lookups in self._child_prefetch_lookups.items():
+                instances = [task for task in self._result_cache if isinstance(task, model)]
+                prefetch_related_objects(instances, *lookups)
+            self._child_prefetch_done = True
+
+
 class Task(PolymorphicModel):
     """
     Parent model for all task types.
@@ -90,8 +214,11 @@ class Task(PolymorphicModel):
                                 help_text=_('Section this task is related to'))
     order_number = models.IntegerField(_('order number'), default=0, help_text=_('Order in which tasks are shown'))
 
+    objects = PolymorphicManager.from_queryset(TaskQuerySet)()
+
     class Meta:
         ordering = ['order_number']
+
     @property
     def task_type(self):
         return 'basic_task'
@@ -108,17 +235,6 @@ class OpenTextTask(Task):
         verbose_name = _('open text task')
         verbose_name_plural = _('open text tasks')
 
-    def get_answers(self, school=None, school_class=None):
-        """
-        Get open text answers filtered by school and class
-        """
-        answers = self.open_text_answers.all()
-        if school:
-            answers = answers.filter(submission__school=school)
-        if school_class:
-            answers = answers.filter(submission__school_class=school_class)
-        return answers
-
     @property
     def task_type(self):
         return 'open_text_task'
@@ -200,16 +316,15 @@ class BudgetingTask(Task):
         verbose_name = _('budgeting task')
         verbose_name_plural = _('budgeting tasks')
 
-    def get_answers(self, school=None, school_class=None):
+    @classmethod
+    def get_sorted_targets_queryset(cls):
         """
-        Get budgeting task answers filtered by school and class
+        Get targets queryset ordered as selected in the task. Sortedm2m applies this ordering only
+        in deprecated get_prefetch_queryset, so it has to be set explicitly when prefetching targets
         """
-        answers = self.budgeting_answers.all()
-        if school:
-            answers = answers.filter(submission__school=school)
-        if school_class:
-            answers = answers.filter(submission__school_class=school_class)
-        return answers
+        through = cls.targets.through
+        return BudgetingTarget.objects.extra(order_by=['{}.{}'.format(through._meta.db_table,
+                                                                      through._sort_field_name)])
 
     @property
     def task_type(self):
@@ -245,9 +360,146 @@ class School(models.Model):
 
 
 class Submission(models.Model):
+    # older submissions were linked to the assignment of their answers, submissions without answers have none
+    assignment = models.ForeignKey(Assignment, related_name='%(class)ss', null=True, on_delete=models.CASCADE)
     school = models.ForeignKey(School, related_name='%(class)ss', on_delete=models.CASCADE)
     school_class = models.ForeignKey(SchoolClass, related_name='%(class)ss', on_delete=models.CASCADE)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['assignment', 'school', 'school_class']),
+            models.Index(fields=['assignment', 'school_class']),
+        ]
+
+
+class SubmissionCounter(models.Model):
+    """
+    Number of submissions of the assignment by the school class, incremented in the transaction of the submissions
+    """
+    assignment = models.ForeignKey(Assignment, related_name='submission_counters', on_delete=models.CASCADE)
+    school = models.ForeignKey(School, related_name='submission_counters', on_delete=models.CASCADE)
+    school_class = models.ForeignKey(SchoolClass, related_name='submission_counters', on_delete=models.CASCADE)
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['assignment', 'school', 'school_class'],
+                                    name='unique_submission_counter'),
+        ]
+
+    @classmethod
+    def increment(cls, assignment_id, counts):
+        """
+        Add numbers of submissions given per (school id, school class id) to the counters of the assignment,
+        creating missing counters. Counters are updated in one statement in a fixed order, so concurrent
+        transactions do not deadlock
+        """
+        if not counts:
+            return
+        quote_name = connection.ops.quote_name
+        table = quote_name(cls._meta.db_table)
+        columns = [quote_name(cls._meta.get_field(name).column) for name in ('assignment', 'school', 'school_class')]
+        sql = 'INSERT INTO {table} ({columns}, {count}) VALUES {values} ON CONFLICT ({columns}) ' \
+              'DO UPDATE SET {count} = {table}.{count} + EXCLUDED.{count}'.format(
+                  table=table, columns=', '.join(columns), count=quote_name('count'),
+                  values=', '.join(['(%s, %s, %s, %s)'] * len(counts)))
+        params = []
+        for (school_id, school_class_id), count in sorted(counts.items()):
+            params.extend([assignment_id, school_id, school_class_id, count])
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+
+    @classmethod
+    def rebuild(cls):
+        """
+        Count submissions of every assignment again. On PostgreSQL the counters are locked before counting, so
+        transactions of submissions increment the counters before they are counted or after they are rebuilt.
+        SQLite lets only one transaction write at a time anyway
+        """
+        with transaction.atomic():
+            if connection.vendor == 'postgresql':
+                with connection.cursor() as cursor:
+                    cursor.execute('LOCK TABLE {} IN EXCLUSIVE MODE'.format(connection.ops.quote_name(
+                        cls._meta.db_table)))
+            counts = Submission.objects.filter(assignment__isnull=False).values_list(
+                'assignment', 'school', 'school_class').annotate(count=models.Count('id')).order_by()
+            counters = [cls(assignment_id=assignment_id, school_id=school_id, school_class_id=school_class_id,
+                            count=count) for assignment_id, school_id, school_class_id, count in counts]
+            cls.objects.all().delete()
+            cls.objects.bulk_create(counters)
+        return counters
+
+
+class FeedbackSignup(models.Model):
+    """
+    Voluntary signup to be sent to the feedback system. Signups are saved in the same transaction as
+    the submission, and sent later by dispatch_feedback_signups management command
+    """
+    STATUS_PENDING = 0
+    STATUS_SENT = 1
+    STATUS_FAILED = 2
+    STATUS_CHOICES = (
+        (STATUS_PENDING, _('Pending')),
+        (STATUS_SENT, _('Sent')),
+        (STATUS_FAILED, _('Failed')),
+    )
+
+    submission = models.ForeignKey(Submission, related_name='feedback_signups', on_delete=models.CASCADE)
+    data = models.JSONField(_('data'), encoder=DjangoJSONEncoder, help_text=_('Data posted to the feedback system'))
+    status = models.IntegerField(_('status'), choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.IntegerField(_('attempts'), default=0, help_text=_('Number of failed sending attempts'))
+    next_attempt_at = models.DateTimeField(_('next attempt at'), default=timezone.now)
+    last_error = models.TextField(_('last error'), blank=True)
+    created_at = models.DateTimeField(_('created at'), auto_now_add=True)
+    sent_at = models.DateTimeField(_('sent at'), null=True, blank=True)
+
+    class Meta:
+        verbose_name = _('feedback signup')
+        verbose_name_plural = _('feedback signups')
+        ordering = ['next_attempt_at']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+        ]
+
+
+class QueuedSubmission(models.Model):
+    """
+    Validated submission waiting to be saved by flush_submission_queue command together with other queued
+    submissions, used if SUBMISSION_QUEUE setting is enabled. Submission that can not be saved is left
+    in the queue with the error
+    """
+    slug = models.SlugField(_('assignment slug'), max_length=80)
+    data = models.JSONField(_('data'), encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(_('created at'), auto_now_add=True)
+    last_error = models.TextField(_('last error'), blank=True)
+
+    class Meta:
+        verbose_name = _('queued submission')
+        verbose_name_plural = _('queued submissions')
+        ordering = ['id']
+
+
+class IdempotencyKey(models.Model):
+    """
+    Response of a request sent with `Idempotency-Key` header, replayed when the request is repeated with the same key.
+    Key is saved in the transaction of the request, so concurrent requests with the same key wait for it to be
+    committed or rolled back
+    """
+    key = models.CharField(_('key'), max_length=255)
+    path = models.CharField(_('path'), max_length=255)
+    fingerprint = models.CharField(_('fingerprint'), max_length=64, help_text=_('Hash of the request data'))
+    status_code = models.PositiveSmallIntegerField(_('status code'), null=True)
+    response = models.JSONField(_('response'), encoder=DjangoJSONEncoder, null=True)
+    created_at = models.DateTimeField(_('created at'), auto_now_add=True)
+    expires_at = models.DateTimeField(_('expires at'), db_index=True)
+
+    class Meta:
+        verbose_name = _('idempotency key')
+        verbose_name_plural = _('idempotency keys')
+        constraints = [
+            models.UniqueConstraint(fields=['key', 'path'], name='unique_idempotency_key_path'),
+        ]
+
 
 class OpenTextAnswer(models.Model):
     """
@@ -288,3 +540,35 @@ class VoluntarySignupTask(Task):
 
     def __str__(self):
         return self.name
+
+
+class AnswerReferences(object):
+    """
+    Assignment id, schools, classes, tasks and budgeting targets of an assignment which submitted answers
+    can refer to, loaded with one query per model
+    """
+
+    def __init__(self, slug):
+        self.slug = slug
+        self.assignment_id = Assignment.objects.filter(slug=slug).values_list('id', flat=True).first()
+        self.school_classes = frozenset(School.classes.through.objects.filter(
+            school__assignments__slug=slug).values_list('school_id', 'schoolclass_id'))
+        self.school_ids = frozenset(school_id for school_id, class_id in self.school_classes)
+        self.open_text_task_ids = frozenset(OpenTextTask.objects.filter(
+            section__assignment__slug=slug).values_list('id', flat=True))
+        self.budgeting_targets = frozenset(BudgetingTask.targets.through.objects.filter(
+            budgetingtask__section__assignment__slug=slug).values_list('budgetingtask_id', 'budgetingtarget_id'))
+        self.budgeting_task_ids = frozenset(task_id for task_id, target_id in self.budgeting_targets)
+
+
+@functools.lru_cache(maxsize=ANSWER_REFERENCES_CACHE_SIZE)
+def load_answer_references(slug, version):
+    return AnswerReferences(slug)
+
+
+def get_answer_references(slug):
+    """
+    Get references of the assignment from the cache of the worker. References are cached per content version,
+    so they are loaded again after the content of the assignment is changed
+    """
+    return load_answer_references(slug, get_content_version(slug))
@@ -0,0 +1,12 @@
+from rest_framework.pagination import CursorPagination
+
+
+class AssignmentCursorPagination(CursorPagination):
+    """
+    Cursor pagination on assignment id. List is paginated only if page size is given in query string,
+    otherwise all the assignments are returned
+    """
+    page_size = None
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = 'id'
@@ -0,0 +1,25 @@
+import codecs
+
+import orjson
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+
+from assignments.renderers import ORJSONRenderer
+
+
+class ORJSONParser(JSONParser):
+    """
+    JSON parser using orjson for UTF-8 encoded requests. Other encodings are parsed by JSONParser
+    """
+    renderer_class = ORJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        if codecs.lookup(encoding).name != 'utf-8' or not self.strict:
+            return super(ORJSONParser, self).parse(stream, media_type, parser_context)
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError('JSON parse error - %s' % str(exc))
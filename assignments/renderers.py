@@ -0,0 +1,86 @@
+import json
+from collections.abc import Iterator
+
+import orjson
+from rest_framework.renderers import JSONRenderer
+
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+STREAM_BUFFER_SIZE = 64 * 1024
+
+
+class ORJSONRenderer(JSONRenderer):
+    """
+    JSON renderer using orjson for compact unicode output, which is the default DRF JSON output.
+    Types orjson does not handle natively, like Decimal, lazy translation strings or datetimes,
+    are encoded by DRF JSON encoder, so the output is equivalent JSON to the output of JSONRenderer.
+    Only floats are formatted differently, without exponent if it is small and without its sign and leading
+    zeros, e.g. 1e-05 as 0.00001 and 1e+16 as 1e16. Indented output and other JSON settings are rendered
+    by JSONRenderer
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        indent = self.get_indent(accepted_media_type, renderer_context or {})
+        if indent is not None or self.ensure_ascii or not self.compact:
+            return super(ORJSONRenderer, self).render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(data, default=self.encoder_class().default, option=ORJSON_OPTIONS)
+        except orjson.JSONEncodeError:
+            # e.g. integers out of 64 bit range
+            return super(ORJSONRenderer, self).render(data, accepted_media_type, renderer_context)
+        # escape line and paragraph separators like JSONRenderer, so the output is a strict javascript subset
+        return ret.replace('\u2028'.encode(), b'\\u2028').replace('\u2029'.encode(), b'\\u2029')
+
+
+def iter_rendered(renderer, data, accepted_media_type=None, renderer_context=None, buffer_size=STREAM_BUFFER_SIZE):
+    """
+    Render data to compact JSON in chunks of about `buffer_size` bytes. Iterators in the data are rendered item
+    by item as they are consumed, so the items do not need to be in memory at once.
+    Output is the same as rendered at once with compact output of the renderer, also for non-string dict keys
+    """
+    buffer = []
+    size = 0
+    for chunk in iter_rendered_values(renderer, data, accepted_media_type, renderer_context):
+        buffer.append(chunk)
+        size += len(chunk)
+        if size >= buffer_size:
+            yield b''.join(buffer)
+            buffer = []
+            size = 0
+    if buffer:
+        yield b''.join(buffer)
+
+
+def render_value(renderer, value, accepted_media_type, renderer_context):
+    # renderers render None as empty content
+    return b'null' if value is None else renderer.render(value, accepted_media_type, renderer_context)
+
+
+def get_json_key(key):
+    # non-string keys converted like json and orjson do
+    if key is None or isinstance(key, bool):
+        return json.dumps(key)
+    return str(key)
+
+
+def iter_rendered_values(renderer, data, accepted_media_type, renderer_context):
+    if isinstance(data, dict):
+        yield b'{'
+        for index, (key, value) in enumerate(data.items()):
+            yield b'%s%s:' % (b',' if index else b'', renderer.render(
+                get_json_key(key), accepted_media_type, renderer_context))
+            yield from iter_rendered_values(renderer, value, accepted_media_type, renderer_context)
+        yield b'}'
+    elif isinstance(data, (list, tuple, Iterator)):
+        yield b'['
+        for index, value in enumerate(data):
+            if index:
+                yield b','
+            if isinstance(data, Iterator):
+                yield render_value(renderer, value, accepted_media_type, renderer_context)
+            else:
+                yield from iter_rendered_values(renderer, value, accepted_media_type, renderer_context)
+        yield b']'
+    else:
+        yield render_value(renderer, data, accepted_media_type, renderer_context)
@@ -1,19 +1,131 @@
-import sys
+from collections import defaultdict
+from collections.abc import Iterator
 
 from django.conf import settings
-from django.db.models import Count
 from django.utils.translation import gettext_lazy as _
 from rest_framework import serializers
 
-from assignments.helper import post_to_feedback_system
+from assignments.budgeting import EMPTY_STATISTICS
+from assignments.exceptions import FeedbackSystemException
+from assignments.geometry import FULL_RESOLUTION
+from assignments.ingestion import save_submissions
 from assignments.models import (
     Assignment, BudgetingTarget, BudgetingTargetAnswer, BudgetingTask, OpenTextAnswer, OpenTextTask, School,
-    SchoolClass, Section, Submission, Task, VoluntarySignupTask
+    SchoolClass, Section, Task, VoluntarySignupTask, get_answer_references
 )
 
-SERIALIZERS_MODULE = sys.modules[__name__]
 
+class TaskTypeRegistry(object):
+    """
+    Registry of serializers used for the data of each task type. Every registered serializer is instantiated
+    once, so its fields are built only once and reused for all tasks of the type
+    """
 
+    def __init__(self):
+        self._serializers = {}
+
+    def register(self, model):
+        """
+        Class decorator registering serializer for the data of the given task model
+        """
+        def register_serializer(serializer_class):
+            self._serializers[model] = serializer_class()
+            return serializer_class
+        return register_serializer
+
+    def get_serializer(self, task):
+        for model in type(task).__mro__:
+            if model in self._serializers:
+                return self._serializers[model]
+        return None
+
+    def get_data(self, task):
+        """
+        Get serialized data of the task. If serializer for task type is not registered, return empty data
+        """
+        serializer = self.get_serializer(task)
+        if serializer is None:
+            return ''
+        return serializer.to_representation(task)
+
+
+task_types = TaskTypeRegistry()
+
+
+class AreaField(serializers.Field):
+    """
+    Assignment area in the resolution given as `area_resolution` in context. Full resolution area is used
+    if simplified area is not available
+    """
+
+    def __init__(self, **kwargs):
+        kwargs['source'] = '*'
+        kwargs['read_only'] = True
+        super(AreaField, self).__init__(**kwargs)
+
+    def to_representation(self, assignment):
+        resolution = self.context.get('area_resolution', FULL_RESOLUTION)
+        return assignment.area_variants.get(resolution, assignment.area)
+
+
+def parse_selected_fields(value):
+    """
+    Parse comma separated field names, where nested fields are separated by dots, into a tree
+    mapping field name to the selection of its nested fields. None means all the fields are selected
+
+    >>> parse_selected_fields('name,sections.title,sections.tasks')
+    {'name': None, 'sections': {'title': None, 'tasks': None}}
+    """
+    if not value:
+        return None
+    selected = {}
+    for path in filter(None, (path.strip() for path in value.split(','))):
+        node = selected
+        *parents, name = path.split('.')
+        for parent in parents:
+            if parent in node and node[parent] is None:
+                # all nested fields of the parent are selected already
+                break
+            node = node.setdefault(parent, {})
+        else:
+            node[name] = None
+    return selected or None
+
+
+def is_field_selected(selected, name):
+    return selected is None or name in selected
+
+
+def get_nested_selection(selected, name):
+    return None if selected is None else selected.get(name)
+
+
+class SelectedFieldsMixin(object):
+    """
+    Serializer mixin limiting serialized fields to a selection, see parse_selected_fields.
+    Top level serializer gets the selection from `fields` in context and passes the nested selections,
+    including None for all the fields, to nested serializers
+    """
+
+    def get_selected_fields(self):
+        if hasattr(self, 'selected_fields'):
+            return self.selected_fields
+        return self.context.get('fields')
+
+    def get_fields(self):
+        fields = super(SelectedFieldsMixin, self).get_fields()
+        selected = self.get_selected_fields()
+        for name in list(fields):
+            if not is_field_selected(selected, name):
+                fields.pop(name)
+                continue
+            nested_serializer = getattr(fields[name], 'child', fields[name])
+            if isinstance(nested_serializer, SelectedFieldsMixin):
+                nested_serializer.selected_fields = get_nested_selection(selected, name)
+        return fields
+
+
+@task_types.register(OpenTextTask)
 class OpenTextTaskSerializer(serializers.ModelSerializer):
     class Meta:
         model = OpenTextTask
@@ -28,6 +140,7 @@ class BudgetingTargetSerializer(serializers.ModelSerializer):
                   'min_amount', 'max_amount', 'icon']
 
 
+@task_types.register(BudgetingTask)
 class BudgetingTaskSerializer(serializers.ModelSerializer):
     targets = BudgetingTargetSerializer(many=True)
     unit = serializers.SerializerMethodField()
@@ -41,13 +154,14 @@ class BudgetingTaskSerializer(serializers.ModelSerializer):
         return obj.get_unit_display()
 
 
+@task_types.register(VoluntarySignupTask)
 class VoluntarySignupTaskSerializer(serializers.ModelSerializer):
     class Meta:
         model = VoluntarySignupTask
         fields = ['name']
 
 
-class TaskSerializer(serializers.ModelSerializer):
+class TaskSerializer(SelectedFieldsMixin, serializers.ModelSerializer):
     data = serializers.SerializerMethodField()
 
     class Meta:
@@ -56,19 +170,12 @@ class TaskSerializer(serializers.ModelSerializer):
 
     def get_data(self, obj):
         """
-        Serialized data depend on Task type.
-        Serializer classes should be named as '<model name>Serializer'. If Serializer class is missing,
-        return empty data
+        Serialized data depend on Task type, see task_types registry
         """
-        try:
-            serializer_type = getattr(SERIALIZERS_MODULE, '{}Serializer'.format(obj.__class__.__name__))
-        except AttributeError:
-            return ''
-        serializer = serializer_type(obj)
-        return serializer.data
+        return task_types.get_data(obj)
 
 
-class SectionSerializer(serializers.ModelSerializer):
+class SectionSerializer(SelectedFieldsMixin, serializers.ModelSerializer):
     tasks = TaskSerializer(many=True)
 
     class Meta:
@@ -76,13 +183,13 @@ class SectionSerializer(serializers.ModelSerializer):
         fields = ['id', 'title', 'description', 'video', 'tasks']
 
 
-class SchoolClassSerializer(serializers.ModelSerializer):
+class SchoolClassSerializer(SelectedFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = SchoolClass
         fields = ['id', 'name']
 
 
-class SchoolSerializer(serializers.ModelSerializer):
+class SchoolSerializer(SelectedFieldsMixin, serializers.ModelSerializer):
     classes = SchoolClassSerializer(many=True)
 
     class Meta:
@@ -90,24 +197,34 @@ class SchoolSerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'classes']
 
 
-class AssignmentSerializer(serializers.ModelSerializer):
+class AssignmentSerializer(SelectedFieldsMixin, serializers.ModelSerializer):
     schools = SchoolSerializer(many=True)
     sections = SectionSerializer(many=True)
+    area = AreaField()
+
+    # fields of compact representation used in assignment list
+    summary_fields = ['id', 'name', 'header', 'image', 'slug', 'status']
 
     class Meta:
         model = Assignment
         fields = ['id', 'name', 'header', 'description',
                   'budget', 'image', 'slug', 'status',
-                  'area', 'sections', 'schools']
+                  'area', 'area_bbox', 'area_centroid', 'sections', 'schools']
 
 
 class OpenTextAnswerSerializer(serializers.ModelSerializer):
+    # task is validated by SubmitAnswersSerializer together with other answers
+    task = serializers.IntegerField(source='task_id')
+
     class Meta:
         model = OpenTextAnswer
         fields = ['id', 'task', 'answer']
 
 
 class BudgetingTargetAnswerSerializer(serializers.ModelSerializer):
+    # task and target are validated by SubmitAnswersSerializer together with other answers
+    task = serializers.IntegerField(source='task_id')
+    target = serializers.IntegerField(source='target_id')
     point = serializers.JSONField(required=False, allow_null=True)
 
     class Meta:
@@ -142,10 +259,13 @@ class VoluntarySignupSerializer(serializers.Serializer):
 
 
 class SubmitAnswersSerializer(serializers.Serializer):
-    school = serializers.PrimaryKeyRelatedField(queryset=School.objects.all(),
-                                                help_text='school DB id')
-    school_class = serializers.PrimaryKeyRelatedField(queryset=SchoolClass.objects.all(),
-                                                      help_text='school class DB id')
+    """
+    Submission validated against references of the assignment cached by the worker, so validation
+    does not query the database
+    """
+    # school and class are validated against schools and classes of the assignment
+    school = serializers.IntegerField(source='school_id', help_text='school DB id')
+    school_class = serializers.IntegerField(source='school_class_id', help_text='school class DB id')
     open_text_tasks = OpenTextAnswerSerializer(many=True, required=False, allow_null=True,
                                                help_text='list of open text task answers')
     budgeting_targets = BudgetingTargetAnswerSerializer(many=True, required=False, allow_null=True,
@@ -154,52 +274,126 @@ class SubmitAnswersSerializer(serializers.Serializer):
                                                 help_text='voluntary task answers')
     feedback_system_success = serializers.SerializerMethodField()
 
+    def validate_voluntary_tasks(self, value):
+        if value and not settings.FEEDBACK_SYSTEM_URL:
+            raise FeedbackSystemException(
+                _('Feedback system: please check if feedback system url is correctly set'))
+        return value
+
     def validate_school(self, value):
-        if not value.assignments.filter(slug=self.context['assignment_slug']).exists():
+        if value not in self.get_answer_references().school_ids:
             raise serializers.ValidationError('You specified school on wrong assignment')
         return value
 
     def validate(self, data):
-        if not data['school_class'].schools.filter(id__in=[data['school'].id]).exists():
+        if (data['school_id'], data['school_class_id']) not in self.get_answer_references().school_classes:
             raise serializers.ValidationError({'school_class': 'Specified class does not exist in specified school'})
+        self.validate_answer_references(data)
         return data
 
+    def get_answer_references(self):
+        """
+        Get references of the assignment shared through context, or from the cache of the worker
+        """
+        if 'answer_references' not in self.context:
+            self.context['answer_references'] = get_answer_references(self.context['assignment_slug'])
+        return self.context['answer_references']
+
+    def validate_answer_references(self, data):
+        """
+        Check answers refer to tasks of the assignment and to targets of their budgeting tasks.
+        References of all the answers are checked against the assignment at once
+        """
+        references = self.get_answer_references()
+        errors = {}
+        open_text_errors = [
+            {} if answer['task_id'] in references.open_text_task_ids else
+            {'task': ['Task {} is not an open text task of the assignment'.format(answer['task_id'])]}
+            for answer in data.get('open_text_tasks') or []
+        ]
+        if any(open_text_errors):
+            errors['open_text_tasks'] = open_text_errors
+        budgeting_errors = []
+        for answer in data.get('budgeting_targets') or []:
+            if answer['task_id'] not in references.budgeting_task_ids:
+                budgeting_errors.append(
+                    {'task': ['Task {} is not a budgeting task of the assignment'.format(answer['task_id'])]})
+            elif (answer['task_id'], answer['target_id']) not in references.budgeting_targets:
+                budgeting_errors.append(
+                    {'target': ['Target {} is not a target of the task'.format(answer['target_id'])]})
+            else:
+                budgeting_errors.append({})
+        if any(budgeting_errors):
+            errors['budgeting_targets'] = budgeting_errors
+        if errors:
+            raise serializers.ValidationError(errors)
+
     def save(self):
-        submission_instance = Submission.objects.create(school=self.validated_data['school'],
-                                                        school_class=self.validated_data['school_class'])
-        open_text_answers = [OpenTextAnswer(
-            submission=submission_instance,
-            **open_text_data) for open_text_data in self.validated_data.get('open_text_tasks', [])]
-        OpenTextAnswer.objects.bulk_create(open_text_answers)
-        budgeting_target_answers = [BudgetingTargetAnswer(
-            submission=submission_instance,
-            **budgeting_text_data) for budgeting_text_data in self.validated_data.get('budgeting_targets', [])]
-        BudgetingTargetAnswer.objects.bulk_create(budgeting_target_answers)
-        self.context['feedback_success_messages'] = []
-        for voluntary_data in self.validated_data.get('voluntary_tasks', []):
-            response = post_to_feedback_system(settings.FEEDBACK_SYSTEM_URL, voluntary_data,
-                                               api_key=settings.FEEDBACK_API_KEY)
-            self.context['feedback_success_messages'].append(response)
+        save_submissions(self.context['assignment_slug'], [self.validated_data])
+        self.context['feedback_signups_count'] = len(self.validated_data.get('voluntary_tasks') or [])
 
     def get_feedback_system_success(self, obj):
-        if self.context.get('feedback_success_messages', []):
-            return _('Feedback system: ') + ';'.join(set(self.context['feedback_success_messages']))
+        if self.context.get('feedback_signups_count'):
+            return _('Feedback system: ') + _('signups will be sent')
         return ''
 
 
+class BulkSubmitAnswersSerializer(serializers.Serializer):
+    submissions = serializers.ListField(child=serializers.DictField(), allow_empty=False,
+                                        help_text='list of submissions')
+
+    def validate_submissions(self, value):
+        if len(value) > settings.BULK_SUBMISSIONS_MAX:
+            raise serializers.ValidationError(
+                'Ensure this field has no more than {} elements.'.format(settings.BULK_SUBMISSIONS_MAX))
+        return value
+
+    def save(self):
+        """
+        Validate the submissions together and save the valid ones at once.
+        Returns the result of every submission in the order of the upload
+        """
+        slug = self.context['assignment_slug']
+        context = dict(self.context, answer_references=get_answer_references(slug))
+        results = []
+        valid_submissions = []
+        for index, data in enumerate(self.validated_data['submissions']):
+            serializer = SubmitAnswersSerializer(data=data, context=context)
+            if serializer.is_valid():
+                results.append({'index': index, 'status': 'created'})
+                valid_submissions.append((results[-1], serializer.validated_data))
+            else:
+                results.append({'index': index, 'status': 'invalid', 'errors': serializer.errors})
+        if valid_submissions:
+            instances = save_submissions(slug, [data for result, data in valid_submissions])
+            for index, (result, data) in enumerate(valid_submissions):
+                if instances is None:
+                    result['status'] = 'queued'
+                else:
+                    result['id'] = instances[index].pk
+        return results
+
+
 # serializers used for getting answers for report generation
+# report serializers expect assignments fetched with AssignmentQuerySet.with_report
+class IterableListSerializer(serializers.ListSerializer):
+    """
+    List serializer representing iterators as iterators, so streamed answers are serialized as they are rendered
+    """
+
+    def to_representation(self, data):
+        if isinstance(data, Iterator):
+            return (self.child.to_representation(item) for item in data)
+        return super(IterableListSerializer, self).to_representation(data)
+
+
 class ReportOpenTextTaskSerializer(serializers.ModelSerializer):
-    answers = serializers.SerializerMethodField()
+    answers = IterableListSerializer(child=OpenTextAnswerSerializer(), source='report_answers')
 
     class Meta:
         model = OpenTextTask
         fields = ['question', 'answers']
 
-    def get_answers(self, obj):
-        answers = obj.get_answers(**self.context['query_params'])
-        serializer = OpenTextAnswerSerializer(instance=answers, many=True)
-        return serializer.data
-
 
 class ReportBudgetingTargetSerializer(serializers.ModelSerializer):
     target = BudgetingTargetSerializer()
@@ -210,16 +404,47 @@ class ReportBudgetingTargetSerializer(serializers.ModelSerializer):
 
 
 class ReportBudgetingTaskSerializer(serializers.ModelSerializer):
-    answers = serializers.SerializerMethodField()
+    answers = IterableListSerializer(child=ReportBudgetingTargetSerializer(), source='report_answers')
 
     class Meta:
         model = BudgetingTask
         fields = ['name', 'budgeting_type', 'answers']
 
-    def get_answers(self, obj):
-        answers = obj.get_answers(**self.context['query_params'])
-        serializer = ReportBudgetingTargetSerializer(instance=answers, many=True)
-        return serializer.data
+
+class BudgetingHistogramSerializer(serializers.Serializer):
+    min = serializers.DecimalField(max_digits=None, decimal_places=2)
+    max = serializers.DecimalField(max_digits=None, decimal_places=2)
+    counts = serializers.ListField(child=serializers.IntegerField())
+
+
+class ReportBudgetingTargetStatisticsSerializer(serializers.Serializer):
+    target = BudgetingTargetSerializer()
+    count = serializers.IntegerField()
+    sum = serializers.DecimalField(max_digits=None, decimal_places=2, allow_null=True)
+    mean = serializers.DecimalField(max_digits=None, decimal_places=2, allow_null=True)
+    median = serializers.DecimalField(max_digits=None, decimal_places=2, allow_null=True)
+    min = serializers.DecimalField(max_digits=None, decimal_places=2, allow_null=True)
+    max = serializers.DecimalField(max_digits=None, decimal_places=2, allow_null=True)
+    mean_difference_to_reference = serializers.DecimalField(max_digits=None, decimal_places=2, allow_null=True)
+    below_reference = serializers.IntegerField()
+    above_reference = serializers.IntegerField()
+    at_min_amount = serializers.IntegerField()
+    at_max_amount = serializers.IntegerField()
+    histogram = BudgetingHistogramSerializer(allow_null=True)
+
+
+class ReportBudgetingTaskStatisticsSerializer(serializers.ModelSerializer):
+    targets = serializers.SerializerMethodField()
+
+    class Meta:
+        model = BudgetingTask
+        fields = ['name', 'budgeting_type', 'targets']
+
+    def get_targets(self, obj):
+        statistics = self.context['budgeting_statistics']
+        targets = [dict(statistics.get((obj.id, target.id), EMPTY_STATISTICS), target=target)
+                   for target in obj.targets.all()]
+        return ReportBudgetingTargetStatisticsSerializer(targets, many=True, context=self.context).data
 
 
 class ReportSectionSerializer(serializers.ModelSerializer):
@@ -231,30 +456,45 @@ class ReportSectionSerializer(serializers.ModelSerializer):
         fields = ['title', 'open_text_tasks', 'budgeting_tasks']
 
     def get_open_text_tasks(self, obj):
-        open_text_tasks = obj.tasks.instance_of(OpenTextTask)
+        open_text_tasks = [task for task in obj.tasks.all() if isinstance(task, OpenTextTask)]
         serializer = ReportOpenTextTaskSerializer(open_text_tasks, many=True, context=self.context)
         return serializer.data
 
     def get_budgeting_tasks(self, obj):
-        budgeting_tasks = obj.tasks.instance_of(BudgetingTask)
-        serializer = ReportBudgetingTaskSerializer(budgeting_tasks, many=True, context=self.context)
+        budgeting_tasks = [task for task in obj.tasks.all() if isinstance(task, BudgetingTask)]
+        if 'budgeting_statistics' in self.context:
+            serializer = ReportBudgetingTaskStatisticsSerializer(budgeting_tasks, many=True, context=self.context)
+        else:
+            serializer = ReportBudgetingTaskSerializer(budgeting_tasks, many=True, context=self.context)
         return serializer.data
 
 
 class ReportAssignmentSerializer(serializers.ModelSerializer):
     submissions = serializers.SerializerMethodField()
     sections = ReportSectionSerializer(many=True)
+    area = AreaField()
 
     class Meta:
         model = Assignment
         fields = ['name', 'area', 'sections', 'submissions']
 
     def get_submissions(self, obj):
-        submissions = obj.get_submissions(**self.context['query_params'])
-        submissions_per_school = submissions.values('school__name').annotate(count=Count('id')).order_by('school__name')
-        submissions_per_class = submissions.values('school_class__name').annotate(count=Count('id')).order_by(
-            'school_class__name')
+        """
+        Get numbers of submissions per school and per class from the submission counters of the assignment
+        """
+        query_params = self.context['query_params']
+        counters = obj.submission_counters.filter(count__gt=0)
+        if query_params['school']:
+            counters = counters.filter(school=query_params['school'])
+        if query_params['school_class']:
+            counters = counters.filter(school_class=query_params['school_class'])
+        per_school = defaultdict(int)
+        per_class = defaultdict(int)
+        for school_name, school_class_name, count in counters.values_list(
+                'school__name', 'school_class__name', 'count'):
+            per_school[school_name] += count
+            per_class[school_class_name] += count
         return {
-            'per_school': submissions_per_school,
-            'per_class': submissions_per_class
+            'per_school': [{'school__name': name, 'count': count} for name, count in sorted(per_school.items())],
+            'per_class': [{'school_class__name': name, 'count': count} for name, count in sorted(per_class.items())],
         }
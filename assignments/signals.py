@@ -0,0 +1,82 @@
+from django.db.models.signals import m2m_changed, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from assignments.cache import invalidate_content
+from assignments.models import (
+    Assignment, BudgetingTarget, BudgetingTask, OpenTextTask, School, SchoolClass, Section, Task, VoluntarySignupTask
+)
+
+
+def get_affected_assignments(instance):
+    """
+    Get assignments whose content includes the instance, or None if the instance is not a part of assignment content
+    """
+    if isinstance(instance, Assignment):
+        return Assignment.objects.filter(pk=instance.pk)
+    if isinstance(instance, Section):
+        return Assignment.objects.filter(pk=instance.assignment_id)
+    if isinstance(instance, Task):
+        return Assignment.objects.filter(sections=instance.section_id)
+    if isinstance(instance, BudgetingTarget):
+        return Assignment.objects.filter(sections__tasks__budgetingtask__targets=instance)
+    if isinstance(instance, School):
+        return Assignment.objects.filter(schools=instance)
+    if isinstance(instance, SchoolClass):
+        return Assignment.objects.filter(schools__classes=instance)
+    return None
+
+
+def invalidate_instance(instance):
+    assignments = get_affected_assignments(instance)
+    if assignments is None:
+        return
+    slugs = list(assignments.values_list('slug', flat=True).distinct())
+    if isinstance(instance, Assignment):
+        slugs.append(instance.slug)
+    invalidate_content(slugs)
+
+
+@receiver(pre_save, sender=Assignment)
+def invalidate_renamed_assignment(sender, instance, raw=False, **kwargs):
+    if raw or instance.pk is None:
+        return
+    invalidate_content(Assignment.objects.filter(pk=instance.pk).exclude(
+        slug=instance.slug).values_list('slug', flat=True))
+
+
+# signals of tasks are sent by the concrete task types
+@receiver(post_save, sender=Assignment)
+@receiver(post_save, sender=Section)
+@receiver(post_save, sender=OpenTextTask)
+@receiver(post_save, sender=BudgetingTask)
+@receiver(post_save, sender=VoluntarySignupTask)
+@receiver(post_save, sender=BudgetingTarget)
+@receiver(post_save, sender=School)
+@receiver(post_save, sender=SchoolClass)
+def invalidate_saved_content(sender, instance, raw=False, **kwargs):
+    if not raw:
+        invalidate_instance(instance)
+
+
+@receiver(pre_delete, sender=Assignment)
+@receiver(pre_delete, sender=Section)
+@receiver(pre_delete, sender=OpenTextTask)
+@receiver(pre_delete, sender=BudgetingTask)
+@receiver(pre_delete, sender=VoluntarySignupTask)
+@receiver(pre_delete, sender=BudgetingTarget)
+@receiver(pre_delete, sender=School)
+@receiver(pre_delete, sender=SchoolClass)
+def invalidate_deleted_content(sender, instance, **kwargs):
+    # relations are still present before delete, so affected assignments can be found
+    invalidate_instance(instance)
+
+
+@receiver(m2m_changed, sender=Assignment.schools.through)
+@receiver(m2m_changed, sender=BudgetingTask.targets.through)
+@receiver(m2m_changed, sender=School.classes.through)
+def invalidate_changed_relation(sender, instance, action, model, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    invalidate_instance(instance)
+    for related_instance in model.objects.filter(pk__in=pk_set or []):
+        invalidate_instance(related_instance)
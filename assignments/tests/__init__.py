@@ -0,0 +1,4 @@
+import pytest
+
+# show differences of compared queries in query harness assertions
+pytest.register_assert_rewrite('assignments.tests.queries')
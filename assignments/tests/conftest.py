@@ -1,7 +1,15 @@
+import socket
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
 import pytest
+from django.core.cache import cache
 from django.shortcuts import reverse
 
-from assignments.models import Assignment, Section
+from assignments.models import Assignment, Section, SubmissionCounter, load_answer_references
 from assignments.tests.factories import (
     AssignmentFactory, BudgetingTargetAnswerFactory, BudgetingTargetFactory, BudgetingTaskFactory,
     OpenTextAnswerFactory, OpenTextTaskFactory, SchoolClassFactory, SchoolFactory, SectionFactory, SubmissionFactory,
@@ -9,6 +17,12 @@ from assignments.tests.factories import (
 )
 
 
+@pytest.fixture(autouse=True)
+def clear_cache():
+    cache.clear()
+    load_answer_references.cache_clear()
+
+
 @pytest.fixture
 def create_assignments():
     assignment_1 = AssignmentFactory()
@@ -105,7 +119,7 @@ def answers():
     assignment = AssignmentFactory(schools=(school,))
     section = SectionFactory(assignment=assignment)
     section_2 = SectionFactory(assignment=assignment)
-    submission = SubmissionFactory(school=school)
+    submission = SubmissionFactory(assignment=assignment, school=school)
     open_text_task = OpenTextTaskFactory(section=section)
     OpenTextAnswerFactory(submission=submission, task=open_text_task)
     budgeting_target_1 = BudgetingTargetFactory()
@@ -113,3 +127,94 @@ def answers():
     budgeting_task = BudgetingTaskFactory(section=section_2, targets=(budgeting_target_1, budgeting_target_2))
     BudgetingTargetAnswerFactory(task=budgeting_task, target=budgeting_target_1, submission=submission)
     BudgetingTargetAnswerFactory(task=budgeting_task, target=budgeting_target_2, submission=submission)
+    SubmissionCounter.rebuild()
+
+
+class StubServer(ThreadingHTTPServer):
+    """
+    HTTP server keeping track of its connections, so that they can be closed and their threads joined on close
+    """
+    daemon_threads = False
+
+    def __init__(self, *args, **kwargs):
+        super(StubServer, self).__init__(*args, **kwargs)
+        self.connections = set()
+        self.connections_lock = threading.Lock()
+
+    def process_request(self, request, client_address):
+        with self.connections_lock:
+            self.connections.add(request)
+        super(StubServer, self).process_request(request, client_address)
+
+    def shutdown_request(self, request):
+        with self.connections_lock:
+            self.connections.discard(request)
+        super(StubServer, self).shutdown_request(request)
+
+    def handle_error(self, request, client_address):
+        # client closes the connection on timeout, e.g. while the response is delayed
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super(StubServer, self).handle_error(request, client_address)
+
+    def close(self):
+        self.shutdown()
+        with self.connections_lock:
+            connections = list(self.connections)
+        for connection in connections:
+            try:
+                connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        # joins the threads of the connections
+        self.server_close()
+
+
+class FeedbackSystemStub(object):
+    """
+    Local HTTP server standing in for the feedback system. Posted data and address of the client
+    connection are collected to `requests`,
+    and every request is answered with `status` and `content` after `delay` seconds
+    """
+
+    def __init__(self):
+        self.requests = []
+        self.status = 201
+        self.content = b'[{"service_request_id": "1"}]'
+        self.delay = 0
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # keep connections alive
+            protocol_version = 'HTTP/1.1'
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers['Content-Length']))
+                stub.requests.append({'headers': self.headers, 'data': parse_qs(body.decode('utf-8')),
+                                      'client_address': self.client_address})
+                time.sleep(stub.delay)
+                self.send_response(stub.status)
+                self.send_header('Content-Type', 'application/json; charset=utf-8')
+                self.send_header('Content-Length', str(len(stub.content)))
+                self.end_headers()
+                self.wfile.write(stub.content)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = StubServer(('127.0.0.1', 0), Handler)
+        self.url = 'http://127.0.0.1:{}/requests.json'.format(self.server.server_port)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def close(self):
+        self.server.close()
+        self.thread.join()
+
+
+@pytest.fixture
+def feedback_system(settings):
+    stub = FeedbackSystemStub()
+    settings.FEEDBACK_SYSTEM_URL = stub.url
+    settings.FEEDBACK_API_KEY = 'test-key'
+    yield stub
+    stub.close()
@@ -1,3 +1,4 @@
+import collections
 import factory
 import factory.fuzzy
 import random
@@ -154,3 +155,43 @@ class AdminFactory(factory.Factory):
     first_name = 'Admin'
     last_name = 'User'
     is_staff = True
+
+
+def create_assignment_at_scale(sections, tasks, targets, submissions, answers):
+    """
+    Create an open assignment with `sections` sections, each having `tasks` open text and `tasks` budgeting tasks
+    with `targets` targets. Every submission answers all open text tasks and `answers` targets of every budgeting
+    task. Answers are bulk created, so large scales can be created in reasonable time
+    """
+    school_classes = [SchoolClassFactory() for _ in range(3)]
+    schools = [SchoolFactory(classes=school_classes) for _ in range(2)]
+    assignment = AssignmentFactory(schools=schools, area={
+        'type': 'Polygon',
+        'coordinates': [[[22.1, 60.4], [22.3, 60.4], [22.3, 60.5], [22.1, 60.5], [22.1, 60.4]]],
+    })
+    open_text_tasks = []
+    budgeting_tasks = []
+    for _ in range(sections):
+        section = SectionFactory(assignment=assignment)
+        for _ in range(tasks):
+            open_text_tasks.append(OpenTextTaskFactory(section=section))
+            task_targets = [BudgetingTargetFactory() for _ in range(targets)]
+            budgeting_tasks.append((BudgetingTaskFactory(section=section, targets=task_targets), task_targets))
+    submission_instances = models.Submission.objects.bulk_create([
+        models.Submission(assignment=assignment, school=schools[i % len(schools)],
+                          school_class=school_classes[i % len(school_classes)])
+        for i in range(submissions)
+    ])
+    models.OpenTextAnswer.objects.bulk_create([
+        models.OpenTextAnswer(submission=submission, task=task, answer='answer {}'.format(submission.id))
+        for submission in submission_instances for task in open_text_tasks
+    ], batch_size=1000)
+    models.BudgetingTargetAnswer.objects.bulk_create([
+        models.BudgetingTargetAnswer(submission=submission, task=task, target=target, amount=random.randint(0, 20),
+                                     point={'type': 'Point', 'coordinates': [22.26, 60.45]})
+        for submission in submission_instances for task, task_targets in budgeting_tasks
+        for target in task_targets[:answers]
+    ], batch_size=1000)
+    models.SubmissionCounter.increment(assignment.id, collections.Counter(
+        (submission.school_id, submission.school_class_id) for submission in submission_instances))
+    return assignment
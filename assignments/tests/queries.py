@@ -0,0 +1,103 @@
+"""
+Query regression harness.
+
+Queries of a request are captured and normalized into fingerprints, where literal values are replaced with `?`
+and lists of values are collapsed, so that the fingerprint describes only the shape of the query.
+Query counts are compared on every database vendor. Sorted fingerprints are compared only on the vendors of
+SNAPSHOT_VENDORS, and stored per vendor in query_snapshots.json next to this module. Changed query shapes fail
+the tests until snapshots are updated by running tests with UPDATE_QUERY_SNAPSHOTS environment variable set,
+so the changes show up in review. A missing snapshot fails the test as well.
+"""
+import json
+import os
+import re
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+SNAPSHOTS_PATH = os.path.join(os.path.dirname(__file__), 'query_snapshots.json')
+# vendors whose query shapes are recorded, other vendors run different queries e.g. for statistics and COPY inserts
+SNAPSHOT_VENDORS = ('sqlite',)
+
+NORMALIZATIONS = (
+    # savepoint names are generated
+    (re.compile(r'(SAVEPOINT) "[^"]+"'), r'\1 ?'),
+    (re.compile(r"'(?:[^']|'')*'"), '?'),
+    (re.compile(r'(?<![\w"])-?\d+(?:\.\d+)?(?:e[-+]?\d+)?\b', re.IGNORECASE), '?'),
+    (re.compile(r'\bIN \(\?(?:, \?)*\)'), 'IN (...)'),
+    # inserted rows, bulk inserts have the same shape whatever the number of rows
+    (re.compile(r'\bVALUES (\(\?(?:, \?)*\))(?:, \1)*'), r'VALUES \1, ...'),
+    (re.compile(r'\s+'), ' '),
+)
+
+
+def get_fingerprint(sql):
+    """
+    Get shape of the SQL query with literal values replaced
+    """
+    for pattern, replacement in NORMALIZATIONS:
+        sql = pattern.sub(replacement, sql)
+    return sql.strip()
+
+
+def capture_fingerprints(request):
+    """
+    Call request and return its response with fingerprints of the issued queries
+    """
+    with CaptureQueriesContext(connection) as context:
+        response = request()
+    return response, [get_fingerprint(query['sql']) for query in context.captured_queries]
+
+
+def load_snapshots():
+    if not os.path.exists(SNAPSHOTS_PATH):
+        return {}
+    with open(SNAPSHOTS_PATH) as snapshots_file:
+        return json.load(snapshots_file)
+
+
+def save_snapshot(name, fingerprints):
+    snapshots = load_snapshots()
+    snapshots.setdefault(connection.vendor, {})[name] = fingerprints
+    with open(SNAPSHOTS_PATH, 'w') as snapshots_file:
+        json.dump(snapshots, snapshots_file, indent=2, sort_keys=True)
+        snapshots_file.write('\n')
+
+
+def assert_fingerprints_match_snapshot(name, fingerprints):
+    """
+    Compare fingerprints with the recorded snapshot of the current database vendor, if it is one of SNAPSHOT_VENDORS
+    """
+    if connection.vendor not in SNAPSHOT_VENDORS:
+        return
+    if os.environ.get('UPDATE_QUERY_SNAPSHOTS'):
+        save_snapshot(name, fingerprints)
+        return
+    snapshot = load_snapshots().get(connection.vendor, {}).get(name)
+    assert snapshot is not None, (
+        'No query snapshot of {} recorded for {}, run tests with UPDATE_QUERY_SNAPSHOTS=1 '
+        'to record the queries'.format(name, connection.vendor))
+    assert fingerprints == snapshot, (
+        'Queries of {} differ from the snapshot, run tests with UPDATE_QUERY_SNAPSHOTS=1 '
+        'to record the new queries'.format(name))
+
+
+def assert_queries_do_not_grow(name, request, fixtures):
+    """
+    Call request with every fixture of increasing size, and check it issues the same queries matching
+    the snapshot. Fixtures are iterated lazily, so a generator can create every fixture right before the request.
+    Returns responses of the requests
+    """
+    responses = []
+    fingerprints = []
+    for fixture in fixtures:
+        response, request_fingerprints = capture_fingerprints(lambda: request(fixture))
+        responses.append(response)
+        # order of some queries depends on the data, e.g. polymorphic child queries follow order of task types
+        fingerprints.append(sorted(request_fingerprints))
+    counts = [len(request_fingerprints) for request_fingerprints in fingerprints]
+    assert len(set(counts)) == 1, 'Query count of {} grows with data size: {}'.format(name, counts)
+    for request_fingerprints in fingerprints[1:]:
+        assert request_fingerprints == fingerprints[0], 'Queries of {} depend on data size'.format(name)
+    assert_fingerprints_match_snapshot(name, fingerprints[0])
+    return responses
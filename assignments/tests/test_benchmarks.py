@@ -0,0 +1,214 @@
+"""
+Benchmarks of the public API endpoints.
+
+Benchmarks are skipped unless BENCHMARK environment variable is set, e.g.
+
+    BENCHMARK=1 BENCHMARK_SCALES=small,medium py.test assignments/tests/test_benchmarks.py
+
+Environment variables:
+    - BENCHMARK_SCALES: comma separated names of scales from SCALES, defaults to small
+    - BENCHMARK_SCALE: custom scale as comma separated key=value pairs of SCALES keys, e.g.
+      sections=5,tasks=5,targets=10,submissions=500,answers=5
+    - BENCHMARK_REPEAT: number of measured requests per scenario, defaults to 5
+    - BENCHMARK_BURST: number of submissions sent at once in burst scenarios, defaults to 100
+    - BENCHMARK_OUTPUT: path of the JSON results file, defaults to benchmark-results.json
+
+Results contain wall time, query count and peak Python memory of every scenario, so they can be compared
+across commits. Burst scenarios record latency percentiles of the submissions and throughput until all of them
+are saved, with submissions saved directly and through the submission queue. Streamed reports are measured
+until the whole response is consumed. Tests run in one transaction, so the cost of committing every submission
+is not included.
+"""
+import json
+import os
+import statistics
+import time
+import tracemalloc
+
+import pytest
+import raven
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.shortcuts import reverse
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from assignments.ingestion import flush_queue
+from assignments.models import BudgetingTask, OpenTextTask, Submission
+from assignments.tests.factories import create_assignment_at_scale
+
+pytestmark = pytest.mark.skipif(not os.environ.get('BENCHMARK'), reason='set BENCHMARK=1 to run benchmarks')
+
+SCALES = {
+    'small': {'sections': 2, 'tasks': 2, 'targets': 5, 'submissions': 20, 'answers': 3},
+    'medium': {'sections': 5, 'tasks': 5, 'targets': 10, 'submissions': 200, 'answers': 5},
+    'large': {'sections': 10, 'tasks': 5, 'targets': 20, 'submissions': 2000, 'answers': 10},
+}
+
+
+def get_scales():
+    scales = {name: SCALES[name] for name in os.environ.get('BENCHMARK_SCALES', 'small').split(',') if name}
+    if os.environ.get('BENCHMARK_SCALE'):
+        scale = dict(SCALES['small'])
+        for item in os.environ['BENCHMARK_SCALE'].split(','):
+            key, value = item.split('=')
+            scale[key.strip()] = int(value)
+        scales['custom'] = scale
+    return scales
+
+
+def measure(request, repeat, setup=None):
+    """
+    Call request repeatedly, measuring wall time, query count and peak memory of every call
+    """
+    wall_times = []
+    queries = []
+    peak_memory = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        tracemalloc.start()
+        with CaptureQueriesContext(connection) as context:
+            start = time.perf_counter()
+            response = request()
+            wall_times.append(time.perf_counter() - start)
+        peak_memory.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+        queries.append(len(context.captured_queries))
+        assert response.status_code < 300, response.content
+    return {
+        'wall_time': {
+            'min': min(wall_times),
+            'median': statistics.median(wall_times),
+            'max': max(wall_times),
+        },
+        'queries': max(queries),
+        'peak_memory': max(peak_memory),
+    }
+
+
+def get_latency_percentiles(latencies):
+    percentiles = statistics.quantiles(latencies, n=100, method='inclusive')
+    return {
+        'median': statistics.median(latencies),
+        'p90': percentiles[89],
+        'p99': percentiles[98],
+        'max': max(latencies),
+    }
+
+
+@pytest.fixture(scope='session')
+def benchmark_results():
+    results = []
+    yield results
+    try:
+        commit = raven.fetch_git_sha(settings.BASE_DIR)
+    except Exception:
+        commit = None
+    output = {
+        'commit': commit,
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'database': connection.vendor,
+        'results': results,
+    }
+    with open(os.environ.get('BENCHMARK_OUTPUT', 'benchmark-results.json'), 'w') as output_file:
+        json.dump(output, output_file, indent=2)
+
+
+@pytest.fixture(params=sorted(get_scales().items()), ids=lambda scale: scale[0])
+def scaled_assignment(request):
+    name, scale = request.param
+    return name, scale, create_assignment_at_scale(**scale)
+
+
+def get_submit_data(assignment, answers):
+    school = assignment.schools.first()
+    return {
+        'school': school.id,
+        'school_class': school.classes.first().id,
+        'open_text_tasks': [
+            {'task': task.id, 'answer': 'benchmark answer'}
+            for task in OpenTextTask.objects.filter(section__assignment=assignment)
+        ],
+        'budgeting_targets': [
+            {'task': task.id, 'target': target.id, 'amount': 10, 'point': [22.26, 60.45]}
+            for task in BudgetingTask.objects.filter(section__assignment=assignment)
+            for target in task.targets.all()[:answers]
+        ],
+    }
+
+
+class TestBenchmarks:
+    repeat = int(os.environ.get('BENCHMARK_REPEAT', 5))
+    burst = int(os.environ.get('BENCHMARK_BURST', 100))
+
+    def record(self, benchmark_results, scenario, endpoint, scale, result):
+        benchmark_results.append(dict(scenario=scenario, endpoint=endpoint, scale=scale, **result))
+
+    @pytest.mark.django_db
+    @pytest.mark.parametrize('cached', [False, True], ids=['uncached', 'cached'])
+    @pytest.mark.parametrize('endpoint', ['assignment-list', 'assignment-detail', 'report-detail'])
+    def test_read_endpoint(self, benchmark_results, scaled_assignment, endpoint, cached):
+        name, scale, assignment = scaled_assignment
+        api_client = APIClient()
+        url = reverse(endpoint) if endpoint == 'assignment-list' else reverse(endpoint, args=[assignment.slug])
+        params = {'expand': 'sections,schools'} if endpoint == 'assignment-list' else {}
+        api_client.get(url, params)
+        result = measure(lambda: api_client.get(url, params), self.repeat, setup=None if cached else cache.clear)
+        self.record(benchmark_results, name, '{} {}'.format(endpoint, 'cached' if cached else 'uncached'), scale,
+                    result)
+
+    @pytest.mark.django_db
+    def test_streamed_report(self, benchmark_results, scaled_assignment):
+        name, scale, assignment = scaled_assignment
+        api_client = APIClient()
+        url = reverse('report-detail', args=[assignment.slug])
+
+        def get_streamed_report():
+            response = api_client.get(url, {'stream': 'true'})
+            for _ in response.streaming_content:
+                pass
+            return response
+
+        result = measure(get_streamed_report, self.repeat)
+        self.record(benchmark_results, name, 'report-detail streamed', scale, result)
+
+    @pytest.mark.django_db
+    def test_submit_answers(self, benchmark_results, scaled_assignment):
+        name, scale, assignment = scaled_assignment
+        api_client = APIClient()
+        url = reverse('answers-list', args=[assignment.slug])
+        data = json.dumps(get_submit_data(assignment, scale['answers']))
+        result = measure(lambda: api_client.post(url, data, content_type='application/json'), self.repeat)
+        self.record(benchmark_results, name, 'answers-list', scale, result)
+
+    @pytest.mark.django_db
+    @pytest.mark.parametrize('queue', [False, True], ids=['direct', 'queued'])
+    def test_submit_answers_burst(self, benchmark_results, scaled_assignment, settings, queue):
+        settings.SUBMISSION_QUEUE = queue
+        # the burst comes from one client of one school
+        settings.SUBMIT_SCHOOL_RATE = settings.SUBMIT_CLIENT_RATE = ''
+        name, scale, assignment = scaled_assignment
+        api_client = APIClient()
+        url = reverse('answers-list', args=[assignment.slug])
+        data = json.dumps(get_submit_data(assignment, scale['answers']))
+        submissions = Submission.objects.count()
+        latencies = []
+        start = time.perf_counter()
+        for _ in range(self.burst):
+            request_start = time.perf_counter()
+            response = api_client.post(url, data, content_type='application/json')
+            latencies.append(time.perf_counter() - request_start)
+            assert response.status_code < 300, response.content
+        flush_start = time.perf_counter()
+        while any(flush_queue()):
+            pass
+        end = time.perf_counter()
+        assert Submission.objects.count() == submissions + self.burst
+        self.record(benchmark_results, name, 'answers-list burst {}'.format('queued' if queue else 'direct'), scale, {
+            'burst': self.burst,
+            'latency': get_latency_percentiles(latencies),
+            'flush_time': end - flush_start,
+            'throughput': self.burst / (end - start),
+        })
@@ -0,0 +1,60 @@
+import csv
+import io
+
+import pytest
+from django.core.management import call_command
+from django.shortcuts import reverse
+from openpyxl import load_workbook
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from assignments.export import EXPORT_COLUMNS, XLSX_CONTENT_TYPE, get_answer_rows
+from assignments.models import Assignment, BudgetingTargetAnswer, OpenTextAnswer, Submission
+
+
+def get_export_url(file_format):
+    return reverse('report-export', args=[Assignment.objects.get().slug, file_format])
+
+
+class TestExport:
+    @pytest.mark.django_db
+    def test_answers_exported_as_csv(self, answers):
+        BudgetingTargetAnswer.objects.filter(id=BudgetingTargetAnswer.objects.first().id).update(
+            point={'type': 'Point', 'coordinates': [22.26, 60.45]})
+        response = APIClient().get(get_export_url('csv'), HTTP_ACCEPT='text/csv')
+        assert response.status_code == status.HTTP_200_OK
+        assert response['Content-Type'] == 'text/csv; charset=utf-8'
+        assert 'attachment' in response['Content-Disposition']
+        rows = list(csv.DictReader(io.StringIO(b''.join(response.streaming_content).decode())))
+        open_text_answer = OpenTextAnswer.objects.select_related('submission__school').get()
+        assert rows[0]['answer_id'] == str(open_text_answer.id)
+        assert rows[0]['answer'] == open_text_answer.answer
+        assert rows[0]['school'] == open_text_answer.submission.school.name
+        budgeting_answers = BudgetingTargetAnswer.objects.select_related('target').order_by('id')
+        assert [(row['answer_type'], row['target']) for row in rows[1:]] == [
+            ('budgeting', answer.target.name) for answer in budgeting_answers]
+        assert (rows[1]['longitude'], rows[1]['latitude']) == ('22.26', '60.45')
+
+    @pytest.mark.django_db
+    def test_answers_exported_as_xlsx(self, answers):
+        OpenTextAnswer.objects.update(answer='Ääkköset\x0b')
+        response = APIClient().get(get_export_url('xlsx'))
+        assert response['Content-Type'] == XLSX_CONTENT_TYPE
+        worksheet = load_workbook(io.BytesIO(b''.join(response.streaming_content)), read_only=True).active
+        rows = list(worksheet.values)
+        assert list(rows[0]) == EXPORT_COLUMNS
+        assert len(rows) == 1 + OpenTextAnswer.objects.count() + BudgetingTargetAnswer.objects.count()
+        assert rows[1][EXPORT_COLUMNS.index('answer')] == 'Ääkköset'
+
+    @pytest.mark.django_db
+    def test_exported_answers_filtered_by_school_class(self, answers):
+        school_class = Submission.objects.get().school_class_id
+        assert len(list(get_answer_rows(Assignment.objects.get(), school_class=school_class))) == 3
+        response = APIClient().get(get_export_url('csv'), {'school_class': school_class + 1})
+        assert b''.join(response.streaming_content).decode().splitlines() == [','.join(EXPORT_COLUMNS)]
+
+    @pytest.mark.django_db
+    def test_answers_exported_with_command(self, answers, tmp_path):
+        output = tmp_path / 'answers.xlsx'
+        call_command('export_answers', Assignment.objects.get().slug, str(output))
+        assert len(list(load_workbook(output, read_only=True).active.values)) == 4
@@ -0,0 +1,178 @@
+import json
+
+import pytest
+from django.core.management import call_command
+from django.shortcuts import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from assignments.exceptions import FeedbackSystemException, FeedbackSystemUnavailableException
+from assignments.feedback import claim_signups, dispatch_signups
+from assignments.helper import CircuitBreaker, get_feedback_system_client
+from assignments.models import Assignment, FeedbackSignup
+
+
+@pytest.fixture
+def signups(answers_submit_with_voluntary_data, feedback_system):
+    assignment = Assignment.objects.get()
+    response = APIClient().post(reverse('answers-list', args=[assignment.slug]),
+                                json.dumps(answers_submit_with_voluntary_data), content_type='application/json')
+    assert response.status_code == 201
+    assert not feedback_system.requests
+    return FeedbackSignup.objects.all()
+
+
+class TestFeedbackDispatcher:
+    @pytest.mark.django_db
+    def test_pending_signups_sent(self, signups, feedback_system):
+        assert dispatch_signups() == (2, 0)
+        assert len(feedback_system.requests) == 2
+        request = feedback_system.requests[0]
+        assert request['headers']['apikey'] == 'test-key'
+        assert request['data']['first_name'] == ['first']
+        assert request['data']['api_key'] == ['test-key']
+        assert all(signup.status == FeedbackSignup.STATUS_SENT and signup.sent_at for signup in signups)
+        # sent signups are not sent again
+        assert dispatch_signups() == (0, 0)
+        assert len(feedback_system.requests) == 2
+
+    @pytest.mark.django_db
+    def test_failed_signup_retried_with_backoff(self, signups, feedback_system, settings):
+        feedback_system.status = 400
+        feedback_system.content = b'[{"code": 400, "description": "Invalid service code"}]'
+        settings.FEEDBACK_RETRY_DELAY = 60
+        assert dispatch_signups() == (0, 2)
+        signup = signups.first()
+        assert signup.status == FeedbackSignup.STATUS_PENDING
+        assert signup.attempts == 1
+        assert 'Invalid service code' in signup.last_error
+        first_delay = signup.next_attempt_at - timezone.now()
+        assert 50 < first_delay.total_seconds() <= 60
+        # signups are not retried before the delay
+        assert dispatch_signups() == (0, 0)
+        signups.update(next_attempt_at=timezone.now())
+        assert dispatch_signups() == (0, 2)
+        signup = signups.first()
+        assert signup.attempts == 2
+        assert (signup.next_attempt_at - timezone.now()).total_seconds() > first_delay.total_seconds()
+
+    @pytest.mark.django_db
+    def test_signup_failed_after_max_attempts(self, signups, feedback_system, settings):
+        feedback_system.status = 503
+        feedback_system.content = b'Service Unavailable'
+        settings.FEEDBACK_MAX_ATTEMPTS = 2
+        dispatch_signups()
+        signups.update(next_attempt_at=timezone.now())
+        dispatch_signups()
+        assert all(signup.status == FeedbackSignup.STATUS_FAILED for signup in signups)
+        signups.update(next_attempt_at=timezone.now())
+        assert dispatch_signups() == (0, 0)
+        assert len(feedback_system.requests) == 4
+
+    @pytest.mark.django_db
+    def test_slow_feedback_system_timed_out(self, signups, feedback_system, settings):
+        feedback_system.delay = 0.5
+        settings.FEEDBACK_TIMEOUT = 0.1
+        assert dispatch_signups(batch_size=1) == (0, 2)
+        assert all('timed out' in signup.last_error for signup in signups)
+
+    @pytest.mark.django_db
+    def test_dispatch_command_sends_signups(self, signups, feedback_system):
+        call_command('dispatch_feedback_signups', batch_size=1)
+        assert len(feedback_system.requests) == 2
+        assert not signups.exclude(status=FeedbackSignup.STATUS_SENT).exists()
+
+
+class TestFeedbackSystemClient:
+    def test_connection_kept_alive(self, feedback_system):
+        client = get_feedback_system_client()
+        assert client.post({'first_name': 'first'}) == 'Created'
+        assert client.post({'first_name': 'second'}) == 'Created'
+        assert get_feedback_system_client() is client
+        assert feedback_system.requests[0]['client_address'] == feedback_system.requests[1]['client_address']
+        assert client.stats['calls'] == 2
+        assert client.stats['failures'] == 0
+        assert client.stats['max_latency'] > 0
+
+    def test_failing_feedback_system_short_circuited(self, feedback_system, settings):
+        settings.FEEDBACK_FAILURE_THRESHOLD = 2
+        feedback_system.status = 503
+        feedback_system.content = b'{"description": "Maintenance break"}'
+        client = get_feedback_system_client()
+        for _ in range(2):
+            with pytest.raises(FeedbackSystemException) as error:
+                client.post({})
+            assert 'Maintenance break' in str(error.value.detail)
+        with pytest.raises(FeedbackSystemUnavailableException):
+            client.post({})
+        assert len(feedback_system.requests) == 2
+        assert client.stats['rejected'] == 1
+        # after reset timeout one trial call is let through, which closes the circuit on success
+        client.breaker.opened_at -= settings.FEEDBACK_RESET_TIMEOUT
+        feedback_system.status = 201
+        client.post({})
+        client.post({})
+        assert len(feedback_system.requests) == 4
+
+    @pytest.mark.parametrize('error', [
+        FeedbackSystemException('Feedback system: too many concurrent requests'), RuntimeError('unexpected')])
+    def test_failed_trial_call_opens_circuit_again(self, feedback_system, settings, monkeypatch, error):
+        settings.FEEDBACK_FAILURE_THRESHOLD = 1
+        feedback_system.status = 503
+        client = get_feedback_system_client()
+        with pytest.raises(FeedbackSystemException):
+            client.post({})
+        client.breaker.opened_at -= settings.FEEDBACK_RESET_TIMEOUT
+
+        def request(data):
+            raise error
+        monkeypatch.setattr(client, 'request', request)
+        with pytest.raises(type(error)):
+            client.post({})
+        assert client.breaker.state == client.breaker.OPEN
+        monkeypatch.undo()
+        client.breaker.opened_at -= settings.FEEDBACK_RESET_TIMEOUT
+        feedback_system.status = 201
+        client.post({})
+        assert client.breaker.state == client.breaker.CLOSED
+
+    def test_unfinished_trial_call_followed_by_another_trial(self, settings):
+        breaker = CircuitBreaker(1, settings.FEEDBACK_RESET_TIMEOUT)
+        breaker.record_failure()
+        breaker.opened_at -= settings.FEEDBACK_RESET_TIMEOUT
+        assert breaker.allow()
+        assert not breaker.allow()
+        breaker.opened_at -= settings.FEEDBACK_RESET_TIMEOUT
+        assert breaker.allow()
+
+    def test_rejected_data_does_not_open_circuit(self, feedback_system, settings):
+        settings.FEEDBACK_FAILURE_THRESHOLD = 1
+        feedback_system.status = 400
+        feedback_system.content = b'[{"code": 400, "description": "Invalid service code"}]'
+        client = get_feedback_system_client()
+        for _ in range(2):
+            with pytest.raises(FeedbackSystemException):
+                client.post({})
+        assert len(feedback_system.requests) == 2
+
+    @pytest.mark.django_db
+    def test_dispatcher_stopped_by_open_circuit(self, signups, feedback_system, settings):
+        settings.FEEDBACK_FAILURE_THRESHOLD = 1
+        feedback_system.status = 503
+        assert dispatch_signups() == (0, 1)
+        assert len(feedback_system.requests) == 1
+        # rejected signup is not counted as failed attempt
+        assert sorted(signups.values_list('attempts', flat=True)) == [0, 1]
+        assert not signups.exclude(status=FeedbackSignup.STATUS_PENDING).exists()
+        # rejected signup is released for the next dispatch instead of waiting for its claim to expire
+        assert signups.get(attempts=0).next_attempt_at <= timezone.now()
+
+    @pytest.mark.django_db
+    def test_claim_covers_connect_and_read_timeouts(self, signups, settings):
+        settings.FEEDBACK_CONNECT_TIMEOUT = 100
+        settings.FEEDBACK_TIMEOUT = 200
+        before = timezone.now()
+        claimed = claim_signups(10)
+        assert len(claimed) == 2
+        lease = min(signups.values_list('next_attempt_at', flat=True)) - before
+        assert lease.total_seconds() >= 2 * 300 + settings.FEEDBACK_RETRY_DELAY
@@ -0,0 +1,70 @@
+import json
+from datetime import timedelta
+
+import pytest
+from django.core.management import call_command
+from django.shortcuts import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from assignments.models import Assignment, IdempotencyKey, OpenTextAnswer, Submission
+
+
+def post_answers(url_name, data, key):
+    assignment = Assignment.objects.get()
+    return APIClient().post(reverse(url_name, args=[assignment.slug]), json.dumps(data),
+                            content_type='application/json', HTTP_IDEMPOTENCY_KEY=key)
+
+
+class TestIdempotency:
+    @pytest.mark.django_db
+    def test_repeated_submission_replayed(self, answers_submit_data):
+        response = post_answers('answers-list', answers_submit_data, 'key-1')
+        assert response.status_code == status.HTTP_201_CREATED
+        assert not response.has_header('Idempotent-Replayed')
+        replayed = post_answers('answers-list', answers_submit_data, 'key-1')
+        assert replayed.status_code == status.HTTP_201_CREATED
+        assert replayed['Idempotent-Replayed'] == 'true'
+        assert replayed.json() == response.json()
+        assert Submission.objects.count() == 1
+        assert OpenTextAnswer.objects.count() == len(answers_submit_data['open_text_tasks'])
+        post_answers('answers-list', answers_submit_data, 'key-2')
+        assert Submission.objects.count() == 2
+
+    @pytest.mark.django_db
+    def test_repeated_bulk_submission_replayed(self, answers_submit_data):
+        data = {'submissions': [answers_submit_data] * 2}
+        response = post_answers('answers-bulk', data, 'key-1')
+        replayed = post_answers('answers-bulk', data, 'key-1')
+        assert replayed.json() == response.json()
+        assert Submission.objects.count() == 2
+
+    @pytest.mark.django_db
+    def test_key_reused_for_different_data_rejected(self, answers_submit_data):
+        post_answers('answers-list', answers_submit_data, 'key-1')
+        answers_submit_data['open_text_tasks'][0]['answer'] = 'Changed answer'
+        response = post_answers('answers-list', answers_submit_data, 'key-1')
+        assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+        assert Submission.objects.count() == 1
+
+    @pytest.mark.django_db
+    def test_failed_submission_not_stored(self, answers_submit_data):
+        school = answers_submit_data.pop('school')
+        response = post_answers('answers-list', answers_submit_data, 'key-1')
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert not IdempotencyKey.objects.exists()
+        answers_submit_data['school'] = school
+        assert post_answers('answers-list', answers_submit_data, 'key-1').status_code == status.HTTP_201_CREATED
+
+    @pytest.mark.django_db
+    def test_expired_key_not_replayed(self, answers_submit_data):
+        post_answers('answers-list', answers_submit_data, 'key-1')
+        IdempotencyKey.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        response = post_answers('answers-list', answers_submit_data, 'key-1')
+        assert not response.has_header('Idempotent-Replayed')
+        assert Submission.objects.count() == 2
+        post_answers('answers-list', answers_submit_data, 'key-2')
+        IdempotencyKey.objects.filter(key='key-2').update(expires_at=timezone.now())
+        call_command('delete_expired_idempotency_keys')
+        assert list(IdempotencyKey.objects.values_list('key', flat=True)) == ['key-1']
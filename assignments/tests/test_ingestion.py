@@ -0,0 +1,62 @@
+import json
+
+import pytest
+from django.core.management import call_command
+from django.shortcuts import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from assignments.ingestion import flush_queue
+from assignments.models import Assignment, BudgetingTargetAnswer, OpenTextAnswer, QueuedSubmission, Submission
+
+
+@pytest.fixture
+def submission_queue(settings):
+    settings.SUBMISSION_QUEUE = True
+
+
+class TestSubmissionQueue:
+    @pytest.mark.django_db
+    def test_queued_submission_saved_on_flush(self, submission_queue, answers_submit_data):
+        assignment = Assignment.objects.get()
+        api_client = APIClient()
+        response = api_client.post(reverse('answers-list', args=[assignment.slug]), json.dumps(answers_submit_data),
+                                   content_type='application/json')
+        assert response.status_code == status.HTTP_201_CREATED
+        assert QueuedSubmission.objects.count() == 1
+        assert not Submission.objects.exists()
+        report_url = reverse('report-detail', args=[assignment.slug])
+        assert api_client.get(report_url).json()['submissions']['per_school'] == []
+        assert flush_queue() == (1, 0)
+        assert not QueuedSubmission.objects.exists()
+        submission = Submission.objects.get()
+        assert submission.school_id == answers_submit_data['school']
+        assert OpenTextAnswer.objects.count() == len(answers_submit_data['open_text_tasks'])
+        assert BudgetingTargetAnswer.objects.count() == len(answers_submit_data['budgeting_targets'])
+        assert api_client.get(report_url).json()['submissions']['per_school'][0]['count'] == 1
+
+    @pytest.mark.django_db
+    def test_queued_bulk_submissions_saved_in_batches(self, submission_queue, answers_submit_data):
+        assignment = Assignment.objects.get()
+        response = APIClient().post(reverse('answers-bulk', args=[assignment.slug]),
+                                    json.dumps({'submissions': [answers_submit_data] * 5}),
+                                    content_type='application/json')
+        assert [result['status'] for result in response.json()['results']] == ['queued'] * 5
+        call_command('flush_submission_queue', batch_size=2)
+        assert Submission.objects.count() == 5
+        assert not QueuedSubmission.objects.exists()
+
+    @pytest.mark.django_db
+    def test_failing_queued_submission_left_in_queue(self, submission_queue, answers_submit_data):
+        assignment = Assignment.objects.get()
+        APIClient().post(reverse('answers-bulk', args=[assignment.slug]),
+                         json.dumps({'submissions': [answers_submit_data] * 3}), content_type='application/json')
+        failing = QueuedSubmission.objects.all()[1]
+        failing.data['school_class_id'] = None
+        failing.save()
+        assert flush_queue() == (2, 1)
+        assert Submission.objects.count() == 2
+        failing.refresh_from_db()
+        assert failing.last_error
+        # failed submission is not tried again
+        assert flush_queue() == (0, 0)
@@ -0,0 +1,148 @@
+import json
+
+import pytest
+from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.shortcuts import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from assignments.models import BudgetingTask, OpenTextTask, School, get_answer_references
+from assignments.tests.factories import create_assignment_at_scale
+from assignments.tests import queries
+from assignments.tests.queries import assert_queries_do_not_grow
+
+# fixture sizes, queries issued by every endpoint should not depend on them
+SIZES = (
+    {'sections': 1, 'tasks': 1, 'targets': 2, 'submissions': 2, 'answers': 1},
+    {'sections': 3, 'tasks': 2, 'targets': 4, 'submissions': 4, 'answers': 3},
+)
+
+
+def create_assignments():
+    for size in SIZES:
+        assignment = create_assignment_at_scale(**size)
+        # cached representations and content types would hide the queries
+        cache.clear()
+        ContentType.objects.clear_cache()
+        yield assignment
+
+
+def get_submit_data(assignment):
+    school = assignment.schools.first()
+    return {
+        'school': school.id,
+        'school_class': school.classes.first().id,
+        'open_text_tasks': [
+            {'task': task.id, 'answer': 'answer'}
+            for task in OpenTextTask.objects.filter(section__assignment=assignment)
+        ],
+        'budgeting_targets': [
+            {'task': task.id, 'target': target.id, 'amount': 1, 'point': [22.26, 60.45]}
+            for task in BudgetingTask.objects.filter(section__assignment=assignment)
+            for target in task.targets.all()
+        ],
+    }
+
+
+def get_page(url_name, get_args=None, **params):
+    """
+    Get function preparing GET request of the page for the assignment
+    """
+    def prepare(assignment):
+        return 'get', reverse(url_name, args=get_args(assignment) if get_args else []), params, {}
+    return prepare
+
+
+def submit_answers(assignment):
+    # references of the assignment are cached by the worker after the first submission
+    get_answer_references(assignment.slug)
+    data = json.dumps(get_submit_data(assignment))
+    return 'post', reverse('answers-list', args=[assignment.slug]), data, {'content_type': 'application/json'}
+
+
+def submit_bulk_answers(assignment):
+    get_answer_references(assignment.slug)
+    data = json.dumps({'submissions': [get_submit_data(assignment)] * 3})
+    return 'post', reverse('answers-bulk', args=[assignment.slug]), data, {'content_type': 'application/json'}
+
+
+def get_slug(assignment):
+    return [assignment.slug]
+
+
+def get_request(client):
+    """
+    Get function making the prepared request. Requests are prepared before queries are captured
+    """
+    def request(prepared):
+        method, url, data, kwargs = prepared
+        return getattr(client, method)(url, data, **kwargs)
+    return request
+
+
+API_ENDPOINTS = [
+    pytest.param('assignment-list', get_page('assignment-list'), id='assignment-list'),
+    pytest.param('assignment-list-expanded', get_page('assignment-list', expand='sections,schools'),
+                 id='assignment-list-expanded'),
+    pytest.param('assignment-detail', get_page('assignment-detail', get_slug), id='assignment-detail'),
+    pytest.param('answers-submit', submit_answers, id='answers-submit'),
+    pytest.param('answers-bulk', submit_bulk_answers, id='answers-bulk'),
+    pytest.param('report-detail', get_page('report-detail', get_slug), id='report-detail'),
+    pytest.param('report-detail-filtered', get_page('report-detail', get_slug, school='1', school_class='1'),
+                 id='report-detail-filtered'),
+    pytest.param('report-detail-statistics', get_page('report-detail', get_slug, statistics='true'),
+                 id='report-detail-statistics'),
+]
+
+ADMIN_PAGES = [
+    pytest.param('admin-assignment-changelist', get_page('admin:assignments_assignment_changelist'),
+                 id='assignment-changelist'),
+    pytest.param('admin-assignment-change', get_page(
+        'admin:assignments_assignment_change', lambda assignment: [assignment.id]), id='assignment-change'),
+    pytest.param('admin-section-changelist', get_page('admin:assignments_section_changelist'),
+                 id='section-changelist'),
+    pytest.param('admin-section-change', get_page(
+        'admin:assignments_section_change', lambda assignment: [assignment.sections.last().id]),
+        id='section-change'),
+    pytest.param('admin-budgetingtarget-changelist', get_page('admin:assignments_budgetingtarget_changelist'),
+                 id='budgetingtarget-changelist'),
+    pytest.param('admin-school-changelist', get_page('admin:assignments_school_changelist'),
+                 id='school-changelist'),
+    pytest.param('admin-school-change', get_page(
+        'admin:assignments_school_change', lambda assignment: [School.objects.filter(assignments=assignment)[0].id]),
+        id='school-change'),
+    pytest.param('admin-schoolclass-changelist', get_page('admin:assignments_schoolclass_changelist'),
+                 id='schoolclass-changelist'),
+]
+
+
+class TestQueries:
+    @pytest.mark.django_db
+    @pytest.mark.parametrize('name, prepare', API_ENDPOINTS)
+    def test_api_endpoint_queries_do_not_grow(self, name, prepare):
+        api_client = APIClient()
+        responses = assert_queries_do_not_grow(
+            name, get_request(api_client), map(prepare, create_assignments()))
+        assert all(response.status_code < status.HTTP_300_MULTIPLE_CHOICES for response in responses)
+
+    @pytest.mark.django_db
+    @pytest.mark.parametrize('name, prepare', ADMIN_PAGES)
+    def test_admin_page_queries_do_not_grow(self, client, name, prepare):
+        client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'admin'))
+        responses = assert_queries_do_not_grow(
+            name, get_request(client), map(prepare, create_assignments()))
+        assert all(response.status_code == status.HTTP_200_OK for response in responses)
+
+    def test_missing_snapshot_of_database_vendor_fails(self, monkeypatch):
+        monkeypatch.delenv('UPDATE_QUERY_SNAPSHOTS', raising=False)
+        monkeypatch.setattr(queries, 'load_snapshots', lambda: {'other': {'assignment-detail': ['SELECT ?']}})
+        with pytest.raises(AssertionError, match='No query snapshot of assignment-detail recorded'):
+            queries.assert_fingerprints_match_snapshot('assignment-detail', ['SELECT ?'])
+
+    def test_snapshot_compared_only_on_snapshot_vendors(self, monkeypatch):
+        monkeypatch.delenv('UPDATE_QUERY_SNAPSHOTS', raising=False)
+        monkeypatch.setattr(queries, 'load_snapshots', lambda: {})
+        monkeypatch.setattr(queries, 'SNAPSHOT_VENDORS', ('other',))
+        queries.assert_fingerprints_match_snapshot('assignment-detail', ['SELECT ?'])
@@ -0,0 +1,62 @@
+import io
+import json
+from decimal import Decimal
+
+import pytest
+from django.shortcuts import reverse
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from assignments.models import Assignment
+from assignments.parsers import ORJSONParser
+from assignments.renderers import ORJSONRenderer, iter_rendered
+
+
+class TestRenderers:
+    @pytest.mark.django_db
+    @pytest.mark.parametrize('url_name', ['assignment-detail', 'report-detail'])
+    def test_orjson_renderer_output_same_as_json_renderer(self, answers, url_name):
+        assignment = Assignment.objects.get()
+        response = APIClient().get(reverse(url_name, args=[assignment.slug]), {'resolution': 'full'})
+        assert response.content == JSONRenderer().render(response.json())
+
+    def test_orjson_renderer_encodes_special_values_as_json_renderer(self):
+        data = {
+            'budget': Decimal('10.50'),
+            'label': _('Feedback system: '),
+            'area': {'type': 'Point', 'coordinates': [22.266667, 60.451389]},
+            'text': 'Ääkköset \u2028\u2029',
+            1: None,
+            'big': 2 ** 70,
+        }
+        assert ORJSONRenderer().render(data) == JSONRenderer().render(data)
+
+    def test_orjson_renderer_output_equivalent_to_json_renderer_for_numbers(self):
+        data = {'small': 1e-05, 'large': 1e16, 'amount': 200.5, 'budget': Decimal('1.10'), 'count': 3}
+        content = ORJSONRenderer().render(data)
+        assert json.loads(content) == json.loads(JSONRenderer().render(data))
+        # floats are formatted as documented in ORJSONRenderer
+        assert b'"small":0.00001' in content and b'"large":1e16' in content
+        assert b'"budget":1.1' in content
+
+    def test_orjson_renderer_indented_output_same_as_json_renderer(self):
+        data = {'name': 'assignment', 'sections': [1, 2]}
+        media_type = 'application/json; indent=4'
+        assert ORJSONRenderer().render(data, media_type) == JSONRenderer().render(data, media_type)
+
+    def test_orjson_parser_output_same_as_json_parser(self):
+        content = '{"school": 1, "answer": "Ääkköset", "amount": 200.5, "point": [123.343, 444.1232]}'.encode()
+        assert ORJSONParser().parse(io.BytesIO(content)) == JSONParser().parse(io.BytesIO(content))
+        with pytest.raises(ParseError):
+            ORJSONParser().parse(io.BytesIO(b'{"amount": NaN}'))
+
+    def test_iter_rendered_output_same_as_rendered_at_once(self):
+        data = {'name': 'Ääkköset', 'sections': [{'answers': iter([{'id': 1, 'point': None}, {'id': 2}])}, None],
+                2: 1.5, True: 1e-05, None: Decimal('2.50')}
+        chunks = list(iter_rendered(ORJSONRenderer(), data, buffer_size=8))
+        assert len(chunks) > 1
+        data['sections'][0]['answers'] = [{'id': 1, 'point': None}, {'id': 2}]
+        assert b''.join(chunks) == ORJSONRenderer().render(data)
@@ -0,0 +1,59 @@
+import pytest
+from rest_framework import serializers
+
+from assignments.models import BudgetingTask, OpenTextTask, Task, VoluntarySignupTask
+from assignments.serializers import (
+    BudgetingTaskSerializer, OpenTextTaskSerializer, TaskSerializer, TaskTypeRegistry, VoluntarySignupTaskSerializer,
+    task_types
+)
+from assignments.tests.factories import (
+    BudgetingTargetFactory, BudgetingTaskFactory, OpenTextTaskFactory, VoluntaryTaskFactory
+)
+
+
+class OrderNumberSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Task
+        fields = ['order_number']
+
+
+class TestTaskTypeRegistry:
+    @pytest.mark.parametrize('model, serializer_class', [
+        (OpenTextTask, OpenTextTaskSerializer),
+        (BudgetingTask, BudgetingTaskSerializer),
+        (VoluntarySignupTask, VoluntarySignupTaskSerializer),
+    ])
+    def test_registered_serializer_used_for_task_type(self, model, serializer_class):
+        assert isinstance(task_types.get_serializer(model()), serializer_class)
+
+    @pytest.mark.django_db
+    def test_task_data_serialized_by_task_type(self):
+        open_text_task = OpenTextTaskFactory(question='Why?')
+        budgeting_task = BudgetingTaskFactory(targets=[BudgetingTargetFactory(name='Trees')])
+        voluntary_task = VoluntaryTaskFactory(name='Join')
+        assert TaskSerializer(open_text_task).data['data'] == {'question': 'Why?'}
+        budgeting_data = TaskSerializer(budgeting_task).data['data']
+        assert budgeting_data['name'] == budgeting_task.name
+        assert [target['name'] for target in budgeting_data['targets']] == ['Trees']
+        assert TaskSerializer(voluntary_task).data['data'] == {'name': 'Join'}
+
+    def test_serializer_of_parent_model_used_for_subclassed_task(self):
+        registry = TaskTypeRegistry()
+        registry.register(Task)(OrderNumberSerializer)
+        assert registry.get_data(OpenTextTask(order_number=3)) == {'order_number': 3}
+        # serializer of the closest model in the MRO is used
+        registry.register(OpenTextTask)(OpenTextTaskSerializer)
+        assert registry.get_data(OpenTextTask(question='Why?')) == {'question': 'Why?'}
+        assert registry.get_data(VoluntarySignupTask(order_number=5)) == {'order_number': 5}
+
+    def test_new_task_type_registered_without_changing_task_serializer(self, monkeypatch):
+        monkeypatch.setattr(task_types, '_serializers', dict(task_types._serializers))
+        assert TaskSerializer(Task(order_number=2)).data['data'] == ''
+        task_types.register(Task)(OrderNumberSerializer)
+        assert TaskSerializer(Task(order_number=2)).data['data'] == {'order_number': 2}
+        assert TaskSerializer(OpenTextTask(question='Why?')).data['data'] == {'question': 'Why?'}
+
+    def test_unregistered_task_type_has_empty_data(self):
+        registry = TaskTypeRegistry()
+        assert registry.get_serializer(OpenTextTask()) is None
+        assert registry.get_data(OpenTextTask(question='Why?')) == ''
@@ -0,0 +1,118 @@
+import json
+from io import StringIO
+from types import SimpleNamespace
+
+import pytest
+from django.core.cache import cache
+from django.core.management import call_command
+from django.shortcuts import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from assignments.models import Assignment, Submission
+from assignments import throttling
+from assignments.throttling import (
+    BUCKET_KEY, SHARED_SCHOOL_BUCKET, SchoolRateThrottle, acquire_submission_slot, get_throttled_counts,
+    release_submission_slot
+)
+
+
+def post_answers(data, url_name='answers-list', address='127.0.0.1', **extra):
+    assignment = Assignment.objects.get()
+    return APIClient().post(reverse(url_name, args=[assignment.slug]), json.dumps(data),
+                            content_type='application/json', REMOTE_ADDR=address, **extra)
+
+
+class TestThrottling:
+    @pytest.mark.django_db
+    def test_submissions_of_school_throttled(self, answers_submit_data, settings):
+        settings.SUBMIT_SCHOOL_RATE = '2/min'
+        response = post_answers({'submissions': [answers_submit_data] * 3}, 'answers-bulk', '10.0.0.1')
+        # bulk upload larger than the bucket is let through when the bucket is full
+        assert response.status_code == status.HTTP_200_OK
+        response = post_answers(answers_submit_data, address='10.0.0.2')
+        assert response.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+        assert 30 <= int(response['Retry-After']) <= 60
+        assert Submission.objects.count() == 3
+        assert get_throttled_counts()['school'] == 1
+
+    @pytest.mark.django_db
+    def test_only_schools_of_assignment_charged(self, answers_submit_data, settings):
+        settings.SUBMIT_SCHOOL_RATE = '1/min'
+        junk_submissions = [dict(answers_submit_data, school=school) for school in ['junk', 999999, None, [1]]]
+        response = post_answers({'submissions': junk_submissions}, 'answers-bulk')
+        assert response.status_code == status.HTTP_200_OK
+        assert not Submission.objects.exists()
+        for ident in ['junk', 999999, None]:
+            assert cache.get(BUCKET_KEY.format(scope='school', ident=ident)) is None
+        assert post_answers(answers_submit_data).status_code == status.HTTP_201_CREATED
+
+    def test_schools_beyond_bucket_limit_share_bucket(self, monkeypatch):
+        monkeypatch.setattr(throttling, 'get_answer_references', lambda slug: SimpleNamespace(school_ids={1, 2, 3}))
+        monkeypatch.setattr(throttling, 'SCHOOL_BUCKETS_MAX', 1)
+        request = SimpleNamespace(data={'submissions': [{'school': school} for school in [3, '2', 1, 1, 4]]})
+        costs = SchoolRateThrottle().get_costs(request, SimpleNamespace(kwargs={'slug': 'slug'}))
+        assert costs == {1: 2, SHARED_SCHOOL_BUCKET: 2}
+
+    @pytest.mark.django_db
+    def test_requests_of_client_throttled(self, answers_submit_data, settings):
+        settings.SUBMIT_CLIENT_RATE = '1/min'
+        assert post_answers(answers_submit_data).status_code == status.HTTP_201_CREATED
+        response = post_answers(answers_submit_data)
+        assert response.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+        assert response.has_header('Retry-After')
+        assert post_answers(answers_submit_data, address='10.0.0.1').status_code == status.HTTP_201_CREATED
+        assert get_throttled_counts()['client'] == 1
+
+    @pytest.mark.django_db
+    def test_client_not_identified_by_forwarded_for_header(self, answers_submit_data, settings):
+        settings.SUBMIT_CLIENT_RATE = '1/min'
+        assert post_answers(answers_submit_data, HTTP_X_FORWARDED_FOR='10.0.0.1').status_code == status.HTTP_201_CREATED
+        response = post_answers(answers_submit_data, HTTP_X_FORWARDED_FOR='10.0.0.2')
+        assert response.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+
+    @pytest.mark.django_db
+    def test_submissions_over_concurrency_limit_rejected(self, answers_submit_data, settings):
+        settings.SUBMIT_MAX_CONCURRENT = 1
+        slot = acquire_submission_slot()
+        assert slot
+        response = post_answers(answers_submit_data)
+        assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+        assert response['Retry-After'] == '1'
+        release_submission_slot(slot)
+        assert post_answers(answers_submit_data).status_code == status.HTTP_201_CREATED
+        # slot is released after the request, also after failed request
+        assert post_answers({}).status_code == status.HTTP_400_BAD_REQUEST
+        assert acquire_submission_slot()
+        assert get_throttled_counts()['concurrency'] == 1
+
+    def test_expired_submission_slot_not_released_from_other_request(self, settings):
+        settings.SUBMIT_MAX_CONCURRENT = 2
+        slot = acquire_submission_slot()
+        cache.delete(slot[0])
+        other_slots = [acquire_submission_slot(), acquire_submission_slot()]
+        assert None not in other_slots
+        # late release of the expired slot does not free the slot taken again
+        release_submission_slot(slot)
+        assert acquire_submission_slot() is None
+        release_submission_slot(other_slots[0])
+        assert acquire_submission_slot()
+
+    @pytest.mark.django_db
+    def test_request_rejected_by_school_rate_takes_no_client_tokens(self, answers_submit_data, settings):
+        settings.SUBMIT_SCHOOL_RATE = '1/min'
+        settings.SUBMIT_CLIENT_RATE = '2/min'
+        assert post_answers(answers_submit_data).status_code == status.HTTP_201_CREATED
+        assert post_answers(answers_submit_data).status_code == status.HTTP_429_TOO_MANY_REQUESTS
+        other_school_data = dict(answers_submit_data, school=answers_submit_data['school'] + 1)
+        assert post_answers(other_school_data).status_code == status.HTTP_400_BAD_REQUEST
+
+    @pytest.mark.django_db
+    def test_throttle_counters_shown_and_reset(self, answers_submit_data, settings):
+        settings.SUBMIT_CLIENT_RATE = '1/min'
+        post_answers(answers_submit_data)
+        post_answers(answers_submit_data)
+        output = StringIO()
+        call_command('throttle_counters', reset=True, stdout=output)
+        assert 'client: 1' in output.getvalue()
+        assert get_throttled_counts()['client'] == 0
@@ -1,18 +1,45 @@
+import gzip
 import json
 from collections import defaultdict
-from unittest.mock import patch
+from io import StringIO
 
+import brotli
 import pytest
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
 from django.shortcuts import reverse
 from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from rest_framework import status
 from rest_framework.test import APIClient
 
+from assignments.cache import (
+    ANSWERS_VERSION_KEY, CONTENT_MODIFIED_KEY, CONTENT_VERSION_KEY, get_content_version
+)
+from assignments.checks import check_shared_cache
 from assignments.models import (
-    Assignment, BudgetingTarget, BudgetingTargetAnswer, BudgetingTask, OpenTextAnswer, OpenTextTask, Submission, Task,
-    VoluntarySignupTask
+    Assignment, BudgetingTarget, BudgetingTargetAnswer, BudgetingTask, FeedbackSignup, OpenTextAnswer, OpenTextTask,
+    Submission, SubmissionCounter, Task, VoluntarySignupTask, get_report_answer_querysets
+)
+from assignments.serializers import AssignmentSerializer
+from assignments.tests.factories import (
+    AdminFactory, AssignmentFactory, BudgetingTargetAnswerFactory, BudgetingTargetFactory, BudgetingTaskFactory,
+    OpenTextTaskFactory, SchoolClassFactory, SchoolFactory, SectionFactory, SubmissionFactory, VoluntaryTaskFactory
 )
-from assignments.tests.factories import AdminFactory
+
+
+def create_assignment_content(assignment, size):
+    """
+    Add `size` sections, tasks of every type, targets and schools to the assignment
+    """
+    for _ in range(size):
+        section = SectionFactory(assignment=assignment)
+        OpenTextTaskFactory(section=section)
+        targets = [BudgetingTargetFactory() for _ in range(size)]
+        BudgetingTaskFactory(section=section, targets=targets)
+        VoluntaryTaskFactory(section=section)
+        assignment.schools.add(SchoolFactory(classes=[SchoolClassFactory() for _ in range(size)]))
 
 
 class TestApi:
@@ -129,6 +156,221 @@ class TestApi:
                     budgeting_targets_response_ids.extend([target['id'] for target in task['data']['targets']])
         assert sorted(list(budgeting_targets_ids)) == sorted(budgeting_targets_response_ids)
 
+    @pytest.mark.django_db
+    @pytest.mark.parametrize('url_name', ['assignment-list', 'assignment-detail'])
+    def test_assignment_queries_count_does_not_depend_on_content_size(self, url_name):
+        api_client = APIClient()
+        queries_count = []
+        for size in (1, 4):
+            assignment = AssignmentFactory()
+            create_assignment_content(assignment, size)
+            url = reverse(url_name, args=[assignment.slug] if url_name == 'assignment-detail' else [])
+            with CaptureQueriesContext(connection) as context:
+                response = api_client.get(url)
+            assert response.status_code == status.HTTP_200_OK
+            queries_count.append(len(context.captured_queries))
+        assert queries_count[0] == queries_count[1]
+
+    @pytest.mark.django_db
+    def test_budgeting_targets_keep_selected_order(self):
+        assignment = AssignmentFactory()
+        section = SectionFactory(assignment=assignment)
+        targets = [BudgetingTargetFactory() for _ in range(3)]
+        BudgetingTaskFactory(section=section, targets=reversed(targets))
+        api_client = APIClient()
+        response = api_client.get(reverse('assignment-detail', args=[assignment.slug]))
+        task_data = response.json()['sections'][0]['tasks'][0]['data']
+        assert [target['id'] for target in task_data['targets']] == [target.id for target in reversed(targets)]
+
+    @pytest.mark.django_db
+    def test_cached_assignment_detail_served_without_queries(self):
+        assignment = AssignmentFactory()
+        create_assignment_content(assignment, 2)
+        api_client = APIClient()
+        url = reverse('assignment-detail', args=[assignment.slug])
+        response = api_client.get(url)
+        with CaptureQueriesContext(connection) as context:
+            cached_response = api_client.get(url)
+        assert cached_response.content == response.content
+        assert not [query for query in context.captured_queries if query['sql'].startswith('SELECT')]
+
+    @pytest.mark.django_db
+    @pytest.mark.parametrize('url_name', ['assignment-detail', 'report-detail', 'answers-list'])
+    def test_unknown_assignment_leaves_no_cache_keys(self, url_name):
+        api_client = APIClient()
+        url = reverse(url_name, args=['unknown'])
+        response = api_client.post(url, {}) if url_name == 'answers-list' else api_client.get(url)
+        assert response.status_code in (status.HTTP_400_BAD_REQUEST, status.HTTP_404_NOT_FOUND)
+        assert not cache.get_many([key.format(slug='unknown') for key in (
+            CONTENT_VERSION_KEY, CONTENT_MODIFIED_KEY, ANSWERS_VERSION_KEY)])
+
+    @pytest.mark.django_db
+    def test_payload_over_cache_max_size_not_cached(self, settings):
+        assignment = AssignmentFactory()
+        create_assignment_content(assignment, 1)
+        url = reverse('assignment-detail', args=[assignment.slug])
+        api_client = APIClient()
+        response = api_client.get(url, HTTP_ACCEPT_ENCODING='identity')
+        settings.ASSIGNMENT_CACHE_MAX_SIZE = len(response.content) - 1
+        cache.clear()
+        assert api_client.get(url, HTTP_ACCEPT_ENCODING='identity').content == response.content
+        with CaptureQueriesContext(connection) as context:
+            assert api_client.get(url, HTTP_ACCEPT_ENCODING='identity').content == response.content
+        assert [query for query in context.captured_queries if query['sql'].startswith('SELECT')]
+        # smaller compressed variants are cached
+        with CaptureQueriesContext(connection) as context:
+            gzip_response = api_client.get(url, HTTP_ACCEPT_ENCODING='gzip')
+        assert gzip.decompress(gzip_response.content) == response.content
+        assert not [query for query in context.captured_queries if query['sql'].startswith('SELECT')]
+
+    @pytest.mark.django_db
+    def test_cached_assignment_detail_invalidated_on_shared_target_change(self):
+        target = BudgetingTargetFactory()
+        assignments = [AssignmentFactory(), AssignmentFactory()]
+        for assignment in assignments:
+            BudgetingTaskFactory(section=SectionFactory(assignment=assignment), targets=[target])
+        api_client = APIClient()
+        for assignment in assignments:
+            api_client.get(reverse('assignment-detail', args=[assignment.slug]))
+        target.name = 'changed target'
+        target.save()
+        for assignment in assignments:
+            response = api_client.get(reverse('assignment-detail', args=[assignment.slug]))
+            assert response.json()['sections'][0]['tasks'][0]['data']['targets'][0]['name'] == 'changed target'
+
+    @pytest.mark.django_db
+    def test_cached_assignment_detail_invalidated_on_relation_change(self):
+        assignment = AssignmentFactory()
+        task = BudgetingTaskFactory(section=SectionFactory(assignment=assignment))
+        api_client = APIClient()
+        url = reverse('assignment-detail', args=[assignment.slug])
+        api_client.get(url)
+        task.targets.add(BudgetingTargetFactory())
+        assignment.schools.add(SchoolFactory())
+        response_data = api_client.get(url).json()
+        assert len(response_data['sections'][0]['tasks'][0]['data']['targets']) == 1
+        assert len(response_data['schools']) == 1
+        assignment.status = Assignment.STATUS_CLOSED
+        assignment.save()
+        assert api_client.get(url).status_code == status.HTTP_404_NOT_FOUND
+
+    @pytest.mark.django_db
+    @pytest.mark.parametrize('task_factory', [OpenTextTaskFactory, BudgetingTaskFactory, VoluntaryTaskFactory])
+    def test_content_version_changed_only_by_content(self, task_factory):
+        assignment = AssignmentFactory()
+        task = task_factory(section=SectionFactory(assignment=assignment))
+        version = get_content_version(assignment.slug)
+        SubmissionFactory(assignment=assignment)
+        assert get_content_version(assignment.slug) == version
+        task.order_number += 1
+        task.save()
+        assert get_content_version(assignment.slug) != version
+        version = get_content_version(assignment.slug)
+        task.delete()
+        assert get_content_version(assignment.slug) != version
+
+    @pytest.mark.django_db
+    @pytest.mark.parametrize('url_name', ['assignment-list', 'assignment-detail'])
+    def test_assignment_not_modified_answered_without_queries(self, url_name):
+        assignment = AssignmentFactory()
+        create_assignment_content(assignment, 1)
+        url = reverse(url_name, args=[assignment.slug] if url_name == 'assignment-detail' else [])
+        api_client = APIClient()
+        response = api_client.get(url)
+        assert response.has_header('Last-Modified')
+        with CaptureQueriesContext(connection) as context:
+            etag_response = api_client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+            modified_response = api_client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        assert etag_response.status_code == status.HTTP_304_NOT_MODIFIED
+        assert modified_response.status_code == status.HTTP_304_NOT_MODIFIED
+        assert etag_response['ETag'] == response['ETag']
+        assert not [query for query in context.captured_queries if query['sql'].startswith('SELECT')]
+
+    @pytest.mark.django_db
+    @pytest.mark.parametrize('url_name', ['assignment-list', 'assignment-detail'])
+    def test_assignment_etag_changed_on_content_change(self, url_name):
+        assignment = AssignmentFactory()
+        section = SectionFactory(assignment=assignment)
+        url = reverse(url_name, args=[assignment.slug] if url_name == 'assignment-detail' else [])
+        api_client = APIClient()
+        response = api_client.get(url)
+        section.title = 'changed title'
+        section.save()
+        changed_response = api_client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        assert changed_response.status_code == status.HTTP_200_OK
+        assert changed_response['ETag'] != response['ETag']
+
+    @pytest.mark.django_db
+    def test_assignment_list_returns_summary_without_querying_relations(self, create_assignments, assignments_url):
+        api_client = APIClient()
+        with CaptureQueriesContext(connection) as context:
+            response = api_client.get(assignments_url)
+        assert set(response.json()[0]) == {'id', 'name', 'header', 'image', 'slug', 'status'}
+        assert not [query for query in context.captured_queries if 'assignments_section' in query['sql']]
+        assert not [query for query in context.captured_queries if 'assignments_school' in query['sql']]
+
+    @pytest.mark.django_db
+    def test_assignment_list_expanded_with_relations(self, create_assignments, assignments_url):
+        api_client = APIClient()
+        response = api_client.get(assignments_url, {'expand': 'sections,schools'})
+        assignment_data = response.json()[0]
+        assert set(assignment_data) == {'id', 'name', 'header', 'image', 'slug', 'status', 'sections', 'schools'}
+        assert {'id', 'title', 'description', 'video', 'tasks'} == set(assignment_data['sections'][0])
+        tasks = [task for section in assignment_data['sections'] for task in section['tasks']]
+        assert tasks and all(set(task) == {'id', 'order_number', 'task_type', 'data'} for task in tasks)
+
+    @pytest.mark.django_db
+    def test_assignment_detail_returns_all_fields_of_selected_relation(self, create_assignments):
+        assignment = Assignment.objects.get(status=Assignment.STATUS_OPEN)
+        response = APIClient().get(reverse('assignment-detail', args=[assignment.slug]), {'fields': 'name,sections'})
+        response_data = response.json()
+        assert set(response_data) == {'name', 'sections'}
+        tasks = [task for section in response_data['sections'] for task in section['tasks']]
+        assert tasks and all(set(task) == {'id', 'order_number', 'task_type', 'data'} for task in tasks)
+
+    @pytest.mark.django_db
+    def test_assignment_detail_returns_selected_nested_fields(self, create_assignments):
+        assignment = Assignment.objects.get(status=Assignment.STATUS_OPEN)
+        api_client = APIClient()
+        url = reverse('assignment-detail', args=[assignment.slug])
+        with CaptureQueriesContext(connection) as context:
+            response = api_client.get(url, {'fields': 'name,sections.title,sections.tasks.id'})
+        response_data = response.json()
+        assert set(response_data) == {'name', 'sections'}
+        for section in response_data['sections']:
+            assert set(section) == {'title', 'tasks'}
+            assert all(set(task) == {'id'} for task in section['tasks'])
+        assert not [query for query in context.captured_queries if 'assignments_budgetingtarget' in query['sql']]
+        assert set(api_client.get(url).json()) == set(AssignmentSerializer.Meta.fields)
+
+    @pytest.mark.django_db
+    def test_assignment_list_paginated_with_page_size(self, assignments_url):
+        assignments = [AssignmentFactory() for _ in range(3)]
+        api_client = APIClient()
+        response_data = api_client.get(assignments_url, {'page_size': 2}).json()
+        assert [data['id'] for data in response_data['results']] == [assignment.id for assignment in assignments[:2]]
+        response_data = api_client.get(response_data['next']).json()
+        assert [data['id'] for data in response_data['results']] == [assignments[2].id]
+        assert response_data['next'] is None
+
+    @pytest.mark.django_db
+    def test_assignment_area_returned_in_selected_resolution(self):
+        ring = [[22.1, 60.1], [22.1500001, 60.1000504], [22.2, 60.1], [22.2, 60.2], [22.1, 60.2], [22.1, 60.1]]
+        area = {'type': 'Polygon', 'coordinates': [ring]}
+        assignment = AssignmentFactory(area=area)
+        api_client = APIClient()
+        url = reverse('assignment-detail', args=[assignment.slug])
+        response_data = api_client.get(url).json()
+        assert response_data['area'] == area
+        assert response_data['area_bbox'] == [22.1, 60.1, 22.2, 60.2]
+        assert response_data['area_centroid']['type'] == 'Point'
+        low_area = api_client.get(url, {'resolution': 'low'}).json()['area']
+        assert len(low_area['coordinates'][0]) == len(ring) - 1
+        high_area = api_client.get(url, {'resolution': 'high'}).json()['area']
+        assert high_area['coordinates'][0][1] == [22.15, 60.10005]
+        response = api_client.get(url, {'resolution': 'unknown'})
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
     @pytest.mark.django_db
     def test_open_text_answers_school_data_saved_successfully(self, answers_submit_data):
         api_client = APIClient()
@@ -180,17 +422,18 @@ class TestApi:
                                                         'coordinates': budgeting_target['point']}).exists()
 
     @pytest.mark.django_db
-    @override_settings(FEEDBACK_SYSTEM_URL='http://test-feedback/')
-    def test_answers_data_voluntary_signup_submitted_successfully(self, answers_submit_with_voluntary_data):
+    def test_answers_data_voluntary_signup_submitted_successfully(self, answers_submit_with_voluntary_data,
+                                                                  feedback_system):
         api_client = APIClient()
         assignment = Assignment.objects.get()
         answers_url = reverse('answers-list', args=[assignment.slug])
-        with patch('assignments.helper.urllib.request.urlopen') as urlopen_mock:
-            response = urlopen_mock.return_value
-            response.reason = 'OK'
-            api_client.post(answers_url, json.dumps(answers_submit_with_voluntary_data),
-                            content_type='application/json')
-        assert urlopen_mock.called
+        response = api_client.post(answers_url, json.dumps(answers_submit_with_voluntary_data),
+                                   content_type='application/json')
+        assert response.status_code == status.HTTP_201_CREATED
+        # signups are sent later by dispatcher
+        assert not feedback_system.requests
+        assert FeedbackSignup.objects.filter(status=FeedbackSignup.STATUS_PENDING).count() == 2
+        assert response.json()['feedback_system_success']
 
     @pytest.mark.django_db
     @override_settings(FEEDBACK_SYSTEM_URL='http://test-feedback/')
@@ -200,9 +443,8 @@ class TestApi:
         api_client = APIClient()
         assignment = Assignment.objects.get()
         answers_url = reverse('answers-list', args=[assignment.slug])
-        with patch('assignments.helper.urllib.request.urlopen'):
-            response = api_client.post(answers_url, json.dumps(answers_submit_with_voluntary_data),
-                                       content_type='application/json')
+        response = api_client.post(answers_url, json.dumps(answers_submit_with_voluntary_data),
+                                   content_type='application/json')
         assert response.status_code == status.HTTP_400_BAD_REQUEST
 
     @pytest.mark.django_db
@@ -211,9 +453,8 @@ class TestApi:
         api_client = APIClient()
         assignment = Assignment.objects.get()
         answers_url = reverse('answers-list', args=[assignment.slug])
-        with patch('assignments.helper.urllib.request.urlopen'):
-            response = api_client.post(answers_url, json.dumps(answers_submit_with_voluntary_data),
-                                       content_type='application/json')
+        response = api_client.post(answers_url, json.dumps(answers_submit_with_voluntary_data),
+                                   content_type='application/json')
         assert response.status_code == status.HTTP_400_BAD_REQUEST
 
     @pytest.mark.django_db
@@ -241,6 +482,36 @@ class TestApi:
         assert BudgetingTargetAnswer.objects.count() == 0
         assert OpenTextAnswer.objects.count() == 0
 
+    @pytest.mark.django_db
+    def test_answers_to_tasks_of_other_assignment_failed_to_save(self, answers_submit_data):
+        assignment = Assignment.objects.get()
+        other_section = SectionFactory()
+        answers_submit_data['open_text_tasks'][1]['task'] = OpenTextTaskFactory(section=other_section).id
+        other_target = BudgetingTargetFactory()
+        answers_submit_data['budgeting_targets'][0]['task'] = BudgetingTaskFactory(
+            section=other_section, targets=[other_target]).id
+        answers_submit_data['budgeting_targets'][0]['target'] = other_target.id
+        api_client = APIClient()
+        answers_url = reverse('answers-list', args=[assignment.slug])
+        response = api_client.post(answers_url, json.dumps(answers_submit_data), content_type='application/json')
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        errors = response.json()
+        assert not errors['open_text_tasks'][0]
+        assert 'task' in errors['open_text_tasks'][1]
+        assert 'task' in errors['budgeting_targets'][0]
+        assert Submission.objects.count() == 0
+
+    @pytest.mark.django_db
+    def test_answer_to_target_of_other_task_failed_to_save(self, answers_submit_data):
+        assignment = Assignment.objects.get()
+        answers_submit_data['budgeting_targets'][0]['target'] = BudgetingTargetFactory().id
+        api_client = APIClient()
+        answers_url = reverse('answers-list', args=[assignment.slug])
+        response = api_client.post(answers_url, json.dumps(answers_submit_data), content_type='application/json')
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert 'target' in response.json()['budgeting_targets'][0]
+        assert BudgetingTargetAnswer.objects.count() == 0
+
     @pytest.mark.django_db
     def test_answer_data_with_missing_target_point_saved(self, answers_submit_data):
         targets = answers_submit_data['budgeting_targets']
@@ -254,6 +525,148 @@ class TestApi:
         response = api_client.post(answers_url, json.dumps(answers_submit_data), content_type='application/json')
         assert response.status_code == status.HTTP_201_CREATED
 
+    @pytest.mark.django_db
+    @pytest.mark.parametrize('url_name', ['assignment-detail', 'report-detail'])
+    def test_compressed_representation_served_as_accepted(self, answers, url_name):
+        assignment = Assignment.objects.get()
+        url = reverse(url_name, args=[assignment.slug])
+        api_client = APIClient()
+        content = api_client.get(url).content
+        gzip_response = api_client.get(url, HTTP_ACCEPT_ENCODING='gzip, deflate')
+        brotli_response = api_client.get(url, HTTP_ACCEPT_ENCODING='gzip;q=0.5, br')
+        assert gzip_response['Content-Encoding'] == 'gzip'
+        assert gzip.decompress(gzip_response.content) == content
+        assert brotli_response['Content-Encoding'] == 'br'
+        assert brotli.decompress(brotli_response.content) == content
+        assert 'Accept-Encoding' in brotli_response['Vary']
+        identity_response = api_client.get(url, HTTP_ACCEPT_ENCODING='br;q=0')
+        assert not identity_response.has_header('Content-Encoding')
+
+    @pytest.mark.django_db
+    def test_bulk_submissions_saved_with_result_per_submission(self, answers_submit_with_voluntary_data, settings):
+        settings.FEEDBACK_SYSTEM_URL = 'http://localhost/'
+        assignment = Assignment.objects.get()
+        other_class = SchoolClassFactory()
+        invalid_data = dict(answers_submit_with_voluntary_data, school_class=other_class.id)
+        api_client = APIClient()
+        bulk_url = reverse('answers-bulk', args=[assignment.slug])
+        response = api_client.post(bulk_url, json.dumps({'submissions': [
+            answers_submit_with_voluntary_data, invalid_data, answers_submit_with_voluntary_data]}),
+            content_type='application/json')
+        assert response.status_code == status.HTTP_200_OK
+        results = response.json()['results']
+        assert [result['status'] for result in results] == ['created', 'invalid', 'created']
+        assert 'school_class' in results[1]['errors']
+        submissions = Submission.objects.all()
+        assert sorted(submission.id for submission in submissions) == [results[0]['id'], results[2]['id']]
+        assert OpenTextAnswer.objects.filter(submission_id=results[0]['id']).count() == 2
+        budgeting_targets = answers_submit_with_voluntary_data['budgeting_targets']
+        assert BudgetingTargetAnswer.objects.filter(submission_id=results[2]['id']).count() == len(budgeting_targets)
+        assert BudgetingTargetAnswer.objects.get(submission_id=results[2]['id']).point['type'] == 'Point'
+        assert FeedbackSignup.objects.count() == 4
+
+    @pytest.mark.django_db
+    def test_bulk_submissions_validated_against_assignment(self, answers_submit_data):
+        assignment = Assignment.objects.get()
+        other_data = dict(answers_submit_data, school=SchoolFactory().id)
+        wrong_target_data = json.loads(json.dumps(answers_submit_data))
+        wrong_target_data['budgeting_targets'][0]['target'] = BudgetingTargetFactory().id
+        api_client = APIClient()
+        bulk_url = reverse('answers-bulk', args=[assignment.slug])
+        with CaptureQueriesContext(connection) as context:
+            response = api_client.post(bulk_url, json.dumps({'submissions': [other_data, wrong_target_data]}),
+                                       content_type='application/json')
+        results = response.json()['results']
+        assert 'school' in results[0]['errors']
+        assert 'target' in results[1]['errors']['budgeting_targets'][0]
+        assert Submission.objects.count() == 0
+        # references of the assignment are loaded once for all the submissions
+        assert len(context.captured_queries) <= 6
+
+    @pytest.mark.django_db
+    def test_cached_answer_references_reloaded_on_content_change(self, answers_submit_data):
+        assignment = Assignment.objects.get()
+        api_client = APIClient()
+        answers_url = reverse('answers-list', args=[assignment.slug])
+        api_client.post(answers_url, json.dumps(answers_submit_data), content_type='application/json')
+        with CaptureQueriesContext(connection) as context:
+            response = api_client.post(answers_url, json.dumps(answers_submit_data), content_type='application/json')
+        assert response.status_code == status.HTTP_201_CREATED
+        assert not [query for query in context.captured_queries if query['sql'].startswith('SELECT')]
+        new_task = OpenTextTaskFactory(section=assignment.sections.get())
+        answers_submit_data['open_text_tasks'].append({'task': new_task.id, 'answer': 'New answer'})
+        response = api_client.post(answers_url, json.dumps(answers_submit_data), content_type='application/json')
+        assert response.status_code == status.HTTP_201_CREATED
+        assert OpenTextAnswer.objects.filter(task=new_task).exists()
+
+    @pytest.mark.django_db
+    def test_too_many_bulk_submissions_rejected(self, answers_submit_data, settings):
+        settings.BULK_SUBMISSIONS_MAX = 1
+        assignment = Assignment.objects.get()
+        response = APIClient().post(reverse('answers-bulk', args=[assignment.slug]),
+                                    json.dumps({'submissions': [answers_submit_data] * 2}),
+                                    content_type='application/json')
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert Submission.objects.count() == 0
+
+    @pytest.mark.django_db
+    def test_cached_report_invalidated_on_submission(self, answers_submit_data):
+        assignment = Assignment.objects.get()
+        api_client = APIClient()
+        report_url = reverse('report-detail', args=[assignment.slug])
+        assert api_client.get(report_url).json()['submissions']['per_school'] == []
+        api_client.post(reverse('answers-list', args=[assignment.slug]), json.dumps(answers_submit_data),
+                        content_type='application/json')
+        assert api_client.get(report_url).json()['submissions']['per_school'][0]['count'] == 1
+
+    @pytest.mark.django_db
+    def test_report_submissions_counted_per_assignment(self, answers_submit_data):
+        assignment = Assignment.objects.get()
+        other_assignment = AssignmentFactory(schools=assignment.schools.all())
+        api_client = APIClient()
+        for slug in (assignment.slug, assignment.slug, other_assignment.slug):
+            api_client.post(reverse('answers-list', args=[slug]), json.dumps(
+                dict(answers_submit_data, open_text_tasks=[], budgeting_targets=[])), content_type='application/json')
+        report_url = reverse('report-detail', args=[assignment.slug])
+        submissions = api_client.get(report_url).json()['submissions']
+        assert [school['count'] for school in submissions['per_school']] == [2]
+        assert [school_class['count'] for school_class in submissions['per_class']] == [2]
+        other_class = answers_submit_data['school_class'] + 1
+        assert api_client.get(report_url, {'school_class': other_class}).json()['submissions']['per_school'] == []
+
+    @pytest.mark.django_db
+    def test_submission_linked_to_assignment(self, answers_submit_data):
+        assignment = Assignment.objects.get()
+        other_assignment = AssignmentFactory(schools=assignment.schools.all())
+        for slug in (assignment.slug, other_assignment.slug):
+            APIClient().post(reverse('answers-list', args=[slug]), json.dumps(
+                dict(answers_submit_data, open_text_tasks=[], budgeting_targets=[])), content_type='application/json')
+        submission = assignment.submissions.get(school=answers_submit_data['school'])
+        assert submission.assignment == assignment
+        assert other_assignment.submissions.get() != submission
+
+    @pytest.mark.django_db
+    @pytest.mark.skipif(connection.vendor != 'sqlite', reason='query plan format of SQLite')
+    def test_filtered_report_answers_found_with_submission_index(self, answers):
+        submission = Submission.objects.get()
+        assignment = Assignment.objects.filter(slug=Assignment.objects.get().slug).values('pk')[:1]
+        answer_querysets = get_report_answer_querysets(submission.school_id, submission.school_class_id, assignment)
+        for _, answer_queryset in answer_querysets.values():
+            assert 'assignments_submission USING COVERING INDEX assignments_assignm_bca5f8_idx' in \
+                answer_queryset.explain()
+
+    @pytest.mark.django_db
+    def test_submission_counters_rebuilt(self, answers):
+        SubmissionCounter.objects.all().delete()
+        with CaptureQueriesContext(connection) as context:
+            call_command('rebuild_submission_counters', stdout=StringIO())
+        counter = SubmissionCounter.objects.get()
+        assert counter.assignment == Assignment.objects.get()
+        assert counter.count == Submission.objects.count()
+        # submissions are counted in the transaction replacing the counters
+        statements = [query['sql'].split()[0] for query in context.captured_queries]
+        assert statements.index('SAVEPOINT') < statements.index('SELECT') < statements.index('DELETE')
+
     @pytest.mark.django_db
     def test_report_with_wrong_assignment_slug_not_found(self, answers):
         api_client = APIClient()
@@ -316,6 +729,61 @@ class TestApi:
                     report_answers_ids.append(answer_data['id'])
         assert sorted(list(budgeting_answers_ids)) == sorted(report_answers_ids)
 
+    @pytest.mark.django_db
+    @pytest.mark.parametrize('filtered', [False, True], ids=['all', 'filtered'])
+    def test_streamed_report_same_as_rendered_report(self, answers, filtered):
+        assignment = Assignment.objects.get()
+        report_url = reverse('report-detail', args=[assignment.slug])
+        params = {'school': Submission.objects.first().school_id} if filtered else {}
+        api_client = APIClient()
+        response = api_client.get(report_url, dict(params, stream='true'))
+        assert response.streaming
+        assert response['Content-Type'] == 'application/json'
+        assert b''.join(response.streaming_content) == api_client.get(report_url, params).content
+
+    @pytest.mark.django_db
+    def test_report_budgeting_statistics_computed(self, answers):
+        answer = BudgetingTargetAnswer.objects.select_related('task', 'target', 'submission').first()
+        BudgetingTarget.objects.filter(id=answer.target_id).update(min_amount=0, max_amount=100, reference_amount=25)
+        BudgetingTargetAnswer.objects.filter(id=answer.id).update(amount=10)
+        for amount in (20, 30, 100):
+            BudgetingTargetAnswerFactory(task=answer.task, target=answer.target, submission=answer.submission,
+                                         amount=amount)
+        answer.task.targets.add(BudgetingTargetFactory())
+        report_url = reverse('report-detail', args=[Assignment.objects.get().slug])
+        response = APIClient().get(report_url, {'statistics': 'true'})
+        budgeting_task = [task for section in response.json()['sections'] for task in section['budgeting_tasks']][0]
+        assert 'answers' not in budgeting_task
+        targets = {target['target']['id']: target for target in budgeting_task['targets']}
+        assert targets[answer.target_id] == dict(
+            targets[answer.target_id], count=4, sum='160.00', mean='40.00', median='25.00', min='10.00',
+            max='100.00', mean_difference_to_reference='15.00', below_reference=2, above_reference=2,
+            at_min_amount=0, at_max_amount=1,
+            histogram={'min': '0.00', 'max': '100.00', 'counts': [0, 1, 1, 1, 0, 0, 0, 0, 0, 1]})
+        assert len(targets) == 3
+        target_without_answers = targets[answer.task.targets.order_by('-id')[0].id]
+        assert (target_without_answers['count'], target_without_answers['mean']) == (0, None)
+        assert target_without_answers['histogram'] is None
+
+    @pytest.mark.django_db
+    def test_report_budgeting_statistics_filtered(self, answers):
+        submission = Submission.objects.get()
+        report_url = reverse('report-detail', args=[Assignment.objects.get().slug])
+        api_client = APIClient()
+        for school_class, count in ((submission.school_class_id, 1), (submission.school_class_id + 1, 0)):
+            response = api_client.get(report_url, {'statistics': 'true', 'school_class': school_class})
+            budgeting_task = [task for section in response.json()['sections']
+                              for task in section['budgeting_tasks']][0]
+            assert [target['count'] for target in budgeting_task['targets']] == [count, count]
+
+    def test_process_local_cache_refused_without_debug(self, settings):
+        settings.DEBUG = False
+        settings.CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+        assert [error.id for error in check_shared_cache(None)] == ['assignments.E001']
+        settings.CACHES = {'default': {'BACKEND': 'django.core.cache.backends.memcached.PyMemcacheCache',
+                                       'LOCATION': 'memcached:11211'}}
+        assert check_shared_cache(None) == []
+
     @pytest.mark.django_db
     def test_api_docs_unauthorized_user_forbidden(self):
         client = APIClient()
@@ -0,0 +1,179 @@
+import logging
+import random
+import time
+import uuid
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.throttling import BaseThrottle
+
+from assignments.models import get_answer_references
+
+logger = logging.getLogger(__name__)
+
+BUCKET_KEY = 'assignments:bucket:{scope}:{ident}'
+THROTTLED_COUNT_KEY = 'assignments:throttled:{scope}'
+SUBMISSION_SLOT_KEY = 'assignments:submission-slot:{index}'
+# schools of a bulk upload beyond the first ones share one bucket, so a request reads a bounded number of buckets
+SCHOOL_BUCKETS_MAX = 20
+SHARED_SCHOOL_BUCKET = 'other'
+# slots leaked by crashed workers are freed when they expire
+SUBMISSION_SLOT_TIMEOUT = 60
+CONCURRENCY_RETRY_AFTER = 1
+SCHOOL_SCOPE = 'school'
+CLIENT_SCOPE = 'client'
+CONCURRENCY_SCOPE = 'concurrency'
+SCOPES = (SCHOOL_SCOPE, CLIENT_SCOPE, CONCURRENCY_SCOPE)
+DURATIONS = {'s': 1, 'm': 60, 'h': 60 * 60, 'd': 60 * 60 * 24}
+
+
+def parse_rate(rate):
+    """
+    Parse rate given as `<number of requests>/<period>`, e.g. 100/min, into number of requests and seconds
+    """
+    num_requests, period = rate.split('/')
+    return int(num_requests), DURATIONS[period[0]]
+
+
+def count_throttled(scope):
+    key = THROTTLED_COUNT_KEY.format(scope=scope)
+    cache.add(key, 0, timeout=None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, timeout=None)
+
+
+def get_throttled_counts():
+    """
+    Get numbers of requests throttled in every scope since the counters were reset
+    """
+    return {scope: cache.get(THROTTLED_COUNT_KEY.format(scope=scope), 0) for scope in SCOPES}
+
+
+def reset_throttled_counts():
+    cache.delete_many([THROTTLED_COUNT_KEY.format(scope=scope) for scope in SCOPES])
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Throttle using token buckets in the shared cache. Bucket of every identity holds up to the number of requests
+    of the rate set in `rate_setting`, and is refilled during the period of the rate. Request takes tokens from
+    the buckets of its identities, and is throttled if any of them does not have enough tokens. Tokens are taken
+    with `take_tokens` once the request is allowed by all the throttles, see TokenBucketThrottleMixin.
+    Like the throttles of Django REST framework, concurrent requests can occasionally take the same tokens
+    """
+    scope = None
+    rate_setting = None
+    timer = time.time
+    buckets = None
+
+    def get_costs(self, request, view):
+        """
+        Get number of tokens taken by the request from the bucket of every identity
+        """
+        raise NotImplementedError('.get_costs() must be overridden')
+
+    def allow_request(self, request, view):
+        rate = getattr(settings, self.rate_setting)
+        if not rate:
+            return True
+        capacity, duration = parse_rate(rate)
+        refill_rate = capacity / duration
+        now = self.timer()
+        buckets = {}
+        self.waits = []
+        costs = {BUCKET_KEY.format(scope=self.scope, ident=ident): cost
+                 for ident, cost in self.get_costs(request, view).items()}
+        stored_buckets = cache.get_many(list(costs))
+        for key, cost in costs.items():
+            tokens, updated = stored_buckets.get(key) or (capacity, now)
+            tokens = min(capacity, tokens + (now - updated) * refill_rate)
+            # request larger than the bucket is let through when the bucket is full, leaving it in debt
+            if tokens < min(cost, capacity):
+                self.waits.append((min(cost, capacity) - tokens) / refill_rate)
+            buckets[key] = (tokens - cost, now)
+        if self.waits:
+            count_throttled(self.scope)
+            logger.warning('Submission throttled by %s rate', self.scope)
+            return False
+        self.buckets = buckets
+        self.duration = duration
+        return True
+
+    def take_tokens(self):
+        """
+        Take the tokens of the allowed request from the buckets
+        """
+        if self.buckets:
+            cache.set_many(self.buckets, timeout=self.duration)
+
+    def wait(self):
+        return max(self.waits)
+
+
+class SchoolRateThrottle(TokenBucketThrottle):
+    """
+    Limit rate of submissions of every school, every submission of a bulk upload takes a token. Only schools
+    of the assignment are charged, so invalid submissions do not use up tokens of other schools or create buckets
+    """
+    scope = SCHOOL_SCOPE
+    rate_setting = 'SUBMIT_SCHOOL_RATE'
+
+    def get_costs(self, request, view):
+        data = request.data if isinstance(request.data, dict) else {}
+        submissions = data.get('submissions') if 'submissions' in data else [data]
+        if not isinstance(submissions, list):
+            return {}
+        school_ids = get_answer_references(view.kwargs['slug']).school_ids
+        costs = Counter()
+        for submission in submissions:
+            school_id = submission.get('school') if isinstance(submission, dict) else None
+            try:
+                school_id = int(school_id)
+            except (TypeError, ValueError):
+                continue
+            if school_id in school_ids:
+                costs[school_id] += 1
+        if len(costs) > SCHOOL_BUCKETS_MAX:
+            shared_school_ids = sorted(costs)[SCHOOL_BUCKETS_MAX:]
+            costs[SHARED_SCHOOL_BUCKET] = sum(costs.pop(school_id) for school_id in shared_school_ids)
+        return costs
+
+
+class ClientRateThrottle(TokenBucketThrottle):
+    """
+    Limit rate of submission requests of every client address
+    """
+    scope = CLIENT_SCOPE
+    rate_setting = 'SUBMIT_CLIENT_RATE'
+
+    def get_costs(self, request, view):
+        return {self.get_ident(request): 1}
+
+
+def acquire_submission_slot():
+    """
+    Take one of SUBMIT_MAX_CONCURRENT slots of submissions processed at once by all the workers. Every slot
+    is a cache key of its own, so a slot leaked by a crashed worker expires without affecting the others.
+    Returns the taken slot, or None if all the slots are taken
+    """
+    slots = settings.SUBMIT_MAX_CONCURRENT
+    token = uuid.uuid4().hex
+    # start from a random slot, so concurrent requests do not all try the same slots
+    start = random.randrange(slots)
+    for index in range(start, start + slots):
+        key = SUBMISSION_SLOT_KEY.format(index=index % slots)
+        if cache.add(key, token, timeout=SUBMISSION_SLOT_TIMEOUT):
+            return key, token
+    count_throttled(CONCURRENCY_SCOPE)
+    logger.warning('Submission rejected with %s submissions processed at once', slots)
+    return None
+
+
+def release_submission_slot(slot):
+    key, token = slot
+    # slot expired during a slow request may have been taken by another request already
+    if cache.get(key) == token:
+        cache.delete(key)
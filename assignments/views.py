@@ -1,11 +1,88 @@
+import tempfile
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+from django.utils.translation import get_language
+from django.utils.translation import gettext_lazy as _
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.mixins import CreateModelMixin, RetrieveModelMixin
+from rest_framework.response import Response
 from rest_framework.viewsets import GenericViewSet, ReadOnlyModelViewSet
 
-from assignments.models import Assignment
-from assignments.serializers import AssignmentSerializer, ReportAssignmentSerializer, SubmitAnswersSerializer
+from assignments.budgeting import get_budgeting_statistics
+from assignments.cache import (
+    IDENTITY, get_accepted_encoding, get_answers_version, get_content_etag, get_content_modified,
+    get_content_version, get_representation, get_representation_key, set_representation
+)
+from assignments.exceptions import (
+    IdempotencyKeyInProgressException, IdempotencyKeyReusedException, SubmissionsOverloadedException
+)
+from assignments.export import XLSX_CONTENT_TYPE, get_answer_rows, iter_csv, write_xlsx
+from assignments.geometry import AREA_RESOLUTIONS, FULL_RESOLUTION
+from assignments.idempotency import claim_key, get_request_fingerprint, store_response
+from assignments.models import Assignment, IdempotencyKey
+from assignments.pagination import AssignmentCursorPagination
+from assignments.renderers import iter_rendered
+from assignments.serializers import (
+    AssignmentSerializer, BulkSubmitAnswersSerializer, ReportAssignmentSerializer, SubmitAnswersSerializer,
+    get_nested_selection, is_field_selected, parse_selected_fields
+)
+from assignments.throttling import (
+    CONCURRENCY_RETRY_AFTER, ClientRateThrottle, SchoolRateThrottle, acquire_submission_slot, release_submission_slot
+)
+
+
+class AreaResolutionMixin(object):
+    """
+    Pass area resolution selected with `resolution` query string parameter to serializer context
+    """
+
+    def get_serializer_context(self):
+        context = super(AreaResolutionMixin, self).get_serializer_context()
+        if getattr(self, 'request', None) is not None:
+            resolution = self.request.query_params.get('resolution', FULL_RESOLUTION)
+            if resolution != FULL_RESOLUTION and resolution not in AREA_RESOLUTIONS:
+                raise ValidationError({'resolution': _('Resolution should be one of: {}').format(
+                    ', '.join(sorted(AREA_RESOLUTIONS) + [FULL_RESOLUTION]))})
+            context['area_resolution'] = resolution
+        return context
+
+
+class CachedRepresentationMixin(object):
+    """
+    Serve JSON representation rendered once per version from cache, compressed in the encoding accepted by client
+    """
+
+    def get_accepted_encoding(self):
+        return get_accepted_encoding(self.request.META.get('HTTP_ACCEPT_ENCODING', ''))
+
+    def get_cached_response(self, name, version, get_response):
+        """
+        Get cached representation of the version, or render and cache the data of the response from given function
+        """
+        request = self.request
+        renderer = request.accepted_renderer
+        if request.accepted_media_type != renderer.media_type or renderer.format != 'json':
+            return get_response()
+        key = get_representation_key(name, self.kwargs[self.lookup_field], get_language(), version,
+                                     request.GET.urlencode())
+        encoding = self.get_accepted_encoding()
+        content = get_representation(key, encoding)
+        if content is None:
+            response = get_response()
+            content = renderer.render(response.data, request.accepted_media_type, self.get_renderer_context())
+            content = set_representation(key, content)[encoding]
+        response = HttpResponse(content, content_type=renderer.media_type)
+        if encoding != IDENTITY:
+            response['Content-Encoding'] = encoding
+        patch_vary_headers(response, ['Accept-Encoding'])
+        return response
 
 
-class AssignmentViewSet(ReadOnlyModelViewSet):
+class AssignmentViewSet(AreaResolutionMixin, CachedRepresentationMixin, ReadOnlyModelViewSet):
     """
     retrieve:
 
@@ -19,7 +96,9 @@ class AssignmentViewSet(ReadOnlyModelViewSet):
         - *budget*: budget specified for the assignment
         - *slug*: unique assignment identifier used in assignment detail url
         - *status*: open/closed status of assignment
-        - *area*: coordinates of assignment map area
+        - *area*: coordinates of assignment map area in selected resolution
+        - *area_bbox*: bounding box of assignment map area as [min x, min y, max x, max y]
+        - *area_centroid*: centroid point of assignment map area
         - *sections*: list of sections defined for assignment
             - *id*: section DB id
             - *title*: section title
@@ -61,23 +140,176 @@ class AssignmentViewSet(ReadOnlyModelViewSet):
 
     list:
 
-    Return a list of all opened assignments
+    Return a list of all opened assignments in compact representation with *id*, *name*, *header*,
+    *image*, *slug* and *status* fields. Other fields can be added using `expand` query string parameter
+
+    - **Query string parameters**:
+        - *fields*: comma separated list of fields to return, nested fields are separated with dots
+        - *expand*: comma separated list of fields to add to the compact list representation
+        - *resolution*: resolution of map area [low/medium/high/full], defaults to full
+        - *page_size*: number of assignments in a list page. If given, list is returned as
+        *results* with *next* and *previous* page links
+        - *cursor*: page cursor used in *next* and *previous* page links
+    - **Example**:
+        `https://www.example.com/v1/assignments/?expand=sections,schools`
+        `https://www.example.com/v1/assignments/<slug>/?fields=name,sections.title,sections.tasks`
+
+    Both list and retrieve responses contain `ETag` and `Last-Modified` headers. Requests with matching
+    `If-None-Match` or `If-Modified-Since` headers are answered with `304 Not Modified`.
+    Retrieve response is compressed with brotli or gzip if accepted in `Accept-Encoding` header.
     """
 
     serializer_class = AssignmentSerializer
+    pagination_class = AssignmentCursorPagination
     lookup_field = 'slug'
 
+    def get_selected_fields(self):
+        """
+        Get fields selected with `fields` and `expand` query string parameters. None means all the fields
+        """
+        selected = parse_selected_fields(self.request.query_params.get('fields'))
+        if selected is None and self.action == 'list':
+            selected = dict.fromkeys(AssignmentSerializer.summary_fields)
+        expand = parse_selected_fields(self.request.query_params.get('expand'))
+        if selected is not None and expand is not None:
+            selected.update(expand)
+        return selected
+
+    def get_serializer_context(self):
+        context = super(AssignmentViewSet, self).get_serializer_context()
+        context['fields'] = self.get_selected_fields()
+        return context
+
     def get_queryset(self):
         """
-        Get only opened assignments
+        Get only opened assignments, prefetching only the relations that are going to be serialized
+        """
+        selected = self.get_selected_fields()
+        sections = get_nested_selection(selected, 'sections')
+        tasks = get_nested_selection(sections, 'tasks')
+        schools = get_nested_selection(selected, 'schools')
+        return Assignment.objects.filter(status=Assignment.STATUS_OPEN).with_content(
+            sections=is_field_selected(selected, 'sections'),
+            tasks=is_field_selected(sections, 'tasks'),
+            targets=is_field_selected(tasks, 'data'),
+            schools=is_field_selected(selected, 'schools'),
+            classes=is_field_selected(schools, 'classes'),
+        )
+
+    def get_content_validators(self, slug, *variant):
+        """
+        Get ETag and Last-Modified of the content version of the assignment or of the catalogue if slug is None
+        """
+        version = get_content_version(slug)
+        etag = get_content_etag(version, self.request.get_full_path(), get_language(),
+                                self.request.accepted_media_type, *variant)
+        return version, etag, get_content_modified(slug)
+
+    def get_conditional_response(self, slug, get_response, *variant):
+        """
+        Answer conditional request with 304 if the content has not changed, otherwise get response from given
+        function called with the current content version
         """
-        return Assignment.objects.filter(status=Assignment.STATUS_OPEN)
+        version, etag, last_modified = self.get_content_validators(slug, *variant)
+        response = get_conditional_response(self.request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = get_response(version)
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.get_conditional_response(
+            None, lambda version: super(AssignmentViewSet, self).list(request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        def get_response(version):
+            return self.get_cached_response(
+                'detail', version, lambda: super(AssignmentViewSet, self).retrieve(request, *args, **kwargs))
+        # compressed representations are different, so they need different ETags
+        return self.get_conditional_response(kwargs[self.lookup_field], get_response, self.get_accepted_encoding())
+
+
+class IdempotentCreateMixin(object):
+    """
+    Answer POST request repeated with the same `Idempotency-Key` header with the stored response of the first request,
+    without processing it again. Relies on atomic requests, so the key is saved only if the request succeeds
+    """
+    idempotency_header = 'Idempotency-Key'
+
+    def get_idempotent_response(self, get_response):
+        key = self.request.headers.get(self.idempotency_header)
+        if not key:
+            return get_response()
+        if len(key) > IdempotencyKey._meta.get_field('key').max_length:
+            raise ValidationError({self.idempotency_header: _('Key is too long')})
+        fingerprint = get_request_fingerprint(self.request)
+        record, created = claim_key(key, self.request.path, fingerprint)
+        if created:
+            response = get_response()
+            store_response(record, response)
+            return response
+        if record.fingerprint != fingerprint:
+            raise IdempotencyKeyReusedException()
+        if record.status_code is None:
+            raise IdempotencyKeyInProgressException()
+        return Response(record.response, status=record.status_code, headers={'Idempotent-Replayed': 'true'})
+
+    def create(self, request, *args, **kwargs):
+        return self.get_idempotent_response(
+            lambda: super(IdempotentCreateMixin, self).create(request, *args, **kwargs))
+
+
+class TokenBucketThrottleMixin(object):
+    """
+    Take tokens of token bucket throttles only if none of the throttles rejects the request, so a request
+    rejected by one limit does not use up the others
+    """
+
+    def check_throttles(self, request):
+        throttles = self.get_throttles()
+        waits = [throttle.wait() for throttle in throttles if not throttle.allow_request(request, self)]
+        if waits:
+            self.throttled(request, max(waits))
+        for throttle in throttles:
+            throttle.take_tokens()
+
+
+class ConcurrencyLimitMixin(object):
+    """
+    Reject requests with 503 and `Retry-After` header while SUBMIT_MAX_CONCURRENT requests are processed at once
+    by all the workers, so that slow requests do not take up all the workers
+    """
+
+    submission_slot = None
 
+    def initial(self, request, *args, **kwargs):
+        super(ConcurrencyLimitMixin, self).initial(request, *args, **kwargs)
+        if settings.SUBMIT_MAX_CONCURRENT:
+            self.submission_slot = acquire_submission_slot()
+            if self.submission_slot is None:
+                raise SubmissionsOverloadedException(wait=CONCURRENCY_RETRY_AFTER)
 
-class SubmitAnswersViewSet(CreateModelMixin, GenericViewSet):
+    def dispatch(self, request, *args, **kwargs):
+        try:
+            return super(ConcurrencyLimitMixin, self).dispatch(request, *args, **kwargs)
+        finally:
+            if self.submission_slot is not None:
+                release_submission_slot(self.submission_slot)
+                self.submission_slot = None
+
+
+class SubmitAnswersViewSet(ConcurrencyLimitMixin, TokenBucketThrottleMixin, IdempotentCreateMixin, CreateModelMixin,
+                           GenericViewSet):
     """
+    create:
+
     Submit assignment answers
 
+    Answers can refer only to tasks of the assignment, and budgeting target answers only to targets
+    of their budgeting task. Voluntary signups are saved with the answers and sent to the feedback system
+    in the background.
+
     - **Input JSON fields**:
         - *school*: school DB id
         - *school_class*: school class DB id
@@ -124,9 +356,44 @@ class SubmitAnswersViewSet(CreateModelMixin, GenericViewSet):
                     "long": 22.26869
                 }]
             }
+
+    bulk:
+
+    Submit answers of many submissions at once, e.g. answers collected offline
+
+    Submissions are validated together, and the valid ones are saved even if others are invalid.
+
+    - **Input JSON fields**:
+        - *submissions*: list of submissions, each with the fields of a single submission
+    - **Output JSON fields**:
+        - *results*: list of results in the order of the submissions
+            - *index*: index of the submission in the list
+            - *status*: submission status [created/queued/invalid]
+            - *id*: submission DB id [only for created submissions]
+            - *errors*: validation errors of the submission [only for invalid submissions]
+
+    If submission queue is enabled, valid submissions are queued and saved in batches shortly after the response.
+
+    Both requests accept `Idempotency-Key` header. Successful request repeated with the same key is answered with
+    the response of the first request with `Idempotent-Replayed` header, without saving the answers again.
+    Requests with the same key sent at once wait for the first one to finish. Keys expire after
+    IDEMPOTENCY_KEY_TTL seconds.
+
+    Submissions of every school and requests of every client are rate limited, and requests over the limits
+    are answered with `429 Too Many Requests`. While too many submissions are processed at once, requests are
+    answered with `503 Service Unavailable`. Both responses contain `Retry-After` header.
     """
 
     serializer_class = SubmitAnswersSerializer
+    throttle_classes = [SchoolRateThrottle, ClientRateThrottle]
+
+    @action(detail=False, methods=['post'], serializer_class=BulkSubmitAnswersSerializer)
+    def bulk(self, request, *args, **kwargs):
+        def get_response():
+            serializer = self.get_serializer(data=request.data)
+            serializer.is_valid(raise_exception=True)
+            return Response({'results': serializer.save()})
+        return self.get_idempotent_response(get_response)
 
     def get_serializer_context(self):
         context = super(SubmitAnswersViewSet, self).get_serializer_context()
@@ -136,8 +403,10 @@ class SubmitAnswersViewSet(CreateModelMixin, GenericViewSet):
         return context
 
 
-class ReportAssignmentViewSet(RetrieveModelMixin, GenericViewSet):
+class ReportAssignmentViewSet(AreaResolutionMixin, CachedRepresentationMixin, RetrieveModelMixin, GenericViewSet):
     """
+    retrieve:
+
     Get answers
 
     Get all answers for specified assignment on report generation
@@ -146,11 +415,20 @@ class ReportAssignmentViewSet(RetrieveModelMixin, GenericViewSet):
     - **Query string parameters**:
         - *school*: school DB id
         - *school_class*: school class DB id
+        - *resolution*: resolution of map area [low/medium/high/full], defaults to full
+        - *stream*: stream the response [true/false], defaults to false
+        - *statistics*: statistics of budgeting target answers instead of the answers [true/false],
+          defaults to false
     - **Example**:
         `https://www.example.com/api/report/<slug>/?school=1&&school_class=2`
+
+    Response is compressed with brotli or gzip if accepted in `Accept-Encoding` header.
+    With `stream=true`, the same JSON is streamed uncompressed while answers are fetched from the database
+    in chunks, which keeps memory use of reports with many answers flat.
+
     - **Output JSON fields**:
         - *name*: assignment name
-        - *area*: coordinates of assignment map area
+        - *area*: coordinates of assignment map area in selected resolution
         - *sections*: list of assignment sections:
             - *title*: section title
             - *open_text_tasks*: list of open text tasks in section:
@@ -174,27 +452,118 @@ class ReportAssignmentViewSet(RetrieveModelMixin, GenericViewSet):
                         - *min_amount*: minimum amount set
                         - *max_amount*: maximum amount set
                         - *icon*: target icon [only for map targets]
-            - *submissions*: Submissions statistics
+                - *targets*: list of budgeting targets with statistics of their answers [only with statistics]:
+                    - *target*: budgeting target like in answers
+                    - *count*: number of answers
+                    - *sum*, *mean*, *median*, *min*, *max*: statistics of answered amounts, null without answers
+                    - *mean_difference_to_reference*: mean amount minus reference amount of the target
+                    - *below_reference*, *above_reference*: numbers of amounts below and above reference amount
+                    - *at_min_amount*, *at_max_amount*: numbers of amounts at minimum and maximum amount
+                    - *histogram*: numbers of amounts in equal bins, null without answers
+                        - *min*: lower bound of the first bin, minimum amount of the target
+                        - *max*: upper bound of the last bin, maximum amount or largest answered amount
+                        - *counts*: numbers of amounts in every bin
+            - *submissions*: Statistics of the submissions of the assignment
                 - *per_class*: list of submitted answers grouped by class
                     - *school_class__name*: school class name
                     - *count*: number of submitted answers
                 - *per_school*: list of submitted answers grouped by school
                     - *school__name*: school name
                     - *count*: number of submitted answers
+
+    export:
+
+    Export answers as CSV or XLSX file
+
+    File has a row for every open text and budgeting target answer of the assignment with the school, class,
+    section, task and target of the answer. Answers can be filtered by school and school class like in the report.
+    CSV is streamed while answers are fetched.
+
+    - **Query string parameters**:
+        - *school*: school DB id
+        - *school_class*: school class DB id
+    - **Example**:
+        `https://www.example.com/api/report/<slug>/export/xlsx/?school=1`
+    - **Columns**: answer_type [open_text/budgeting], answer_id, submission_id, school_id, school, school_class_id,
+      school_class, section, task_id, task, answer [open text answers], target_id, target, unit_price, amount,
+      longitude, latitude [budgeting target answers]
     """
 
     serializer_class = ReportAssignmentSerializer
-
-    queryset = Assignment.objects.all()
     lookup_field = 'slug'
 
-    def get_serializer_context(self):
-        context = super(ReportAssignmentViewSet, self).get_serializer_context()
-        task_query_params = {
+    def get_answer_filters(self):
+        return {
             'school': self.request.query_params.get('school', None),
             'school_class': self.request.query_params.get('school_class', None)
         }
+
+    def is_streamed(self):
+        """
+        Stream the response if requested and rendered in compact JSON, which can be rendered in chunks
+        """
+        request = getattr(self, 'request', None)
+        if request is None or request.query_params.get('stream') != 'true':
+            return False
+        renderer = request.accepted_renderer
+        return renderer.format == 'json' and renderer.get_indent(
+            request.accepted_media_type, self.get_renderer_context()) is None
+
+    def is_statistics(self):
+        request = getattr(self, 'request', None)
+        return request is not None and request.query_params.get('statistics') == 'true'
+
+    def get_queryset(self):
+        if self.action == 'export':
+            return Assignment.objects.all()
+        assignment = Assignment.objects.filter(slug=self.kwargs.get(self.lookup_field)).values('pk')[:1]
+        return Assignment.objects.with_report(answers=not self.is_streamed(), statistics=self.is_statistics(),
+                                              assignment=assignment, **self.get_answer_filters())
+
+    def get_serializer_context(self):
+        context = super(ReportAssignmentViewSet, self).get_serializer_context()
         context.update({
-            'query_params': task_query_params
+            'query_params': self.get_answer_filters()
         })
+        if self.is_statistics():
+            context['budgeting_statistics'] = get_budgeting_statistics(
+                self.kwargs[self.lookup_field], **self.get_answer_filters())
         return context
+
+    def get_streamed_response(self):
+        """
+        Get response rendering the report while answers are fetched, answers are not kept in memory or cached
+        """
+        instance = self.get_object()
+        instance.iterate_report_answers(**self.get_answer_filters())
+        data = self.get_serializer(instance).data
+        renderer = self.request.accepted_renderer
+        content = iter_rendered(renderer, data, self.request.accepted_media_type, self.get_renderer_context())
+        return StreamingHttpResponse(content, content_type=renderer.media_type)
+
+    def perform_content_negotiation(self, request, force=False):
+        # exports are not rendered by the renderers, so any accepted media type is fine
+        return super(ReportAssignmentViewSet, self).perform_content_negotiation(
+            request, force=force or self.action == 'export')
+
+    @action(detail=True, url_path='export/(?P<file_format>csv|xlsx)')
+    def export(self, request, file_format, *args, **kwargs):
+        assignment = self.get_object()
+        rows = get_answer_rows(assignment, **self.get_answer_filters())
+        filename = '{}-answers.{}'.format(assignment.slug, file_format)
+        if file_format == 'xlsx':
+            output = tempfile.TemporaryFile()
+            write_xlsx(rows, output)
+            output.seek(0)
+            return FileResponse(output, as_attachment=True, filename=filename, content_type=XLSX_CONTENT_TYPE)
+        response = StreamingHttpResponse(iter_csv(rows), content_type='text/csv; charset=utf-8')
+        response['Content-Disposition'] = 'attachment; filename="{}"'.format(filename)
+        return response
+
+    def retrieve(self, request, *args, **kwargs):
+        if self.is_streamed():
+            return self.get_streamed_response()
+        slug = kwargs[self.lookup_field]
+        version = '{}-{}'.format(get_content_version(slug), get_answers_version(slug))
+        return self.get_cached_response(
+            'report', version, lambda: super(ReportAssignmentViewSet, self).retrieve(request, *args, **kwargs))
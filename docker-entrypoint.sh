@@ -27,6 +27,12 @@ elif [ "$1" = "e" ]; then
   shift
   _log "Executing $@"
   exec "$@"
+elif [ "$1" = "dispatch_feedback_signups" ]; then
+  _log "Sending voluntary signups to the feedback system..."
+  exec python manage.py dispatch_feedback_signups --loop
+elif [ "$1" = "flush_submission_queue" ]; then
+  _log "Saving queued submissions..."
+  exec python manage.py flush_submission_queue --loop
 elif [ "$1" = "createsuperuser" ]; then
   shift
   _log ">> Command: createsuperuser <<"
@@ -2,8 +2,8 @@ from django.contrib.admin import AdminSite
 from django.contrib.auth.models import Group, User
 from django.utils.translation import gettext_lazy as _
 
-from assignments.admin import AssignmentAdmin, BudgetingTargetAdmin, SectionAdmin
-from assignments.models import Assignment, BudgetingTarget, School, SchoolClass, Section
+from assignments.admin import AssignmentAdmin, BudgetingTargetAdmin, FeedbackSignupAdmin, SectionAdmin
+from assignments.models import Assignment, BudgetingTarget, FeedbackSignup, School, SchoolClass, Section
 
 
 class TurunAdminSite(AdminSite):
@@ -17,6 +17,7 @@ admin_site = TurunAdminSite()
 admin_site.register(Assignment, AssignmentAdmin)
 admin_site.register(Section, SectionAdmin)
 admin_site.register(BudgetingTarget, BudgetingTargetAdmin)
+admin_site.register(FeedbackSignup, FeedbackSignupAdmin)
 admin_site.register(School)
 admin_site.register(SchoolClass)
 admin_site.register(User)
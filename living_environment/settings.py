@@ -30,11 +30,27 @@ env = environ.Env(
     FEEDBACK_SYSTEM_URL=(str, ''),
     FEEDBACK_SERVICE_CODE=(str, ''),
     FEEDBACK_API_KEY=(str, ''),
+    FEEDBACK_TIMEOUT=(float, 10),
+    FEEDBACK_CONNECT_TIMEOUT=(float, 3),
+    FEEDBACK_MAX_CONNECTIONS=(int, 4),
+    FEEDBACK_FAILURE_THRESHOLD=(int, 5),
+    FEEDBACK_RESET_TIMEOUT=(int, 30),
+    FEEDBACK_RETRY_DELAY=(int, 60),
+    FEEDBACK_MAX_ATTEMPTS=(int, 10),
     FRONTEND_APP_URL=(str, ''),
     MEDIA_ROOT=(environ.Path(), root('media')),
     STATIC_ROOT=(environ.Path(), root('static')),
     STATIC_URL=(str, '/static/'),
     MEDIA_URL=(str, '/media/'),
+    ASSIGNMENT_CACHE_TIMEOUT=(int, 60 * 60 * 24),
+    ASSIGNMENT_CACHE_MAX_SIZE=(int, 1000 * 1000),
+    BULK_SUBMISSIONS_MAX=(int, 500),
+    IDEMPOTENCY_KEY_TTL=(int, 60 * 60 * 24),
+    SUBMISSION_QUEUE=(bool, False),
+    SUBMIT_SCHOOL_RATE=(str, '600/min'),
+    SUBMIT_CLIENT_RATE=(str, '1200/min'),
+    SUBMIT_MAX_CONCURRENT=(int, 15),
+    NUM_PROXIES=(int, 0),
 )
 if os.path.exists(env_file):
     env.read_env(env_file)
@@ -175,13 +191,54 @@ CORS_ALLOWED_ORIGINS = env.list('CORS_ORIGIN_WHITELIST')
 FEEDBACK_SYSTEM_URL = env.str('FEEDBACK_SYSTEM_URL')
 FEEDBACK_SERVICE_CODE = env.str('FEEDBACK_SERVICE_CODE')
 FEEDBACK_API_KEY = env.str('FEEDBACK_API_KEY')
+# Signups are sent to the feedback system by dispatch_feedback_signups command. Timeout in seconds of
+# feedback system requests, delay in seconds of the first retry doubled on every failed attempt, and number
+# of attempts after which the signup is left failed
+FEEDBACK_TIMEOUT = env.float('FEEDBACK_TIMEOUT')
+FEEDBACK_CONNECT_TIMEOUT = env.float('FEEDBACK_CONNECT_TIMEOUT')
+FEEDBACK_RETRY_DELAY = env.int('FEEDBACK_RETRY_DELAY')
+FEEDBACK_MAX_ATTEMPTS = env.int('FEEDBACK_MAX_ATTEMPTS')
+# Feedback system client of every worker keeps at most FEEDBACK_MAX_CONNECTIONS connections open. After
+# FEEDBACK_FAILURE_THRESHOLD consecutive failures calls are rejected without trying for FEEDBACK_RESET_TIMEOUT seconds
+FEEDBACK_MAX_CONNECTIONS = env.int('FEEDBACK_MAX_CONNECTIONS')
+FEEDBACK_FAILURE_THRESHOLD = env.int('FEEDBACK_FAILURE_THRESHOLD')
+FEEDBACK_RESET_TIMEOUT = env.int('FEEDBACK_RESET_TIMEOUT')
 
 FRONTEND_APP_URL = env.str('FRONTEND_APP_URL').rstrip('/')
 
+# Lifetime in seconds of cached assignment payloads, cached payloads are invalidated on content change anyway
+ASSIGNMENT_CACHE_TIMEOUT = env.int('ASSIGNMENT_CACHE_TIMEOUT')
+# Largest cached payload in bytes, larger ones are rendered on every request. Memcached stores items up to 1 MB
+ASSIGNMENT_CACHE_MAX_SIZE = env.int('ASSIGNMENT_CACHE_MAX_SIZE')
+
+# Maximum number of submissions uploaded in one bulk request
+BULK_SUBMISSIONS_MAX = env.int('BULK_SUBMISSIONS_MAX')
+# Lifetime in seconds of idempotency keys of submissions, expired keys are deleted by
+# delete_expired_idempotency_keys command
+IDEMPOTENCY_KEY_TTL = env.int('IDEMPOTENCY_KEY_TTL')
+# Queue validated submissions to be saved in batches by flush_submission_queue command instead of saving them
+# in the request
+SUBMISSION_QUEUE = env.bool('SUBMISSION_QUEUE')
+# Rates of submissions of every school and of submission requests of every client as <number>/<period>,
+# e.g. 600/min, and number of submission requests processed at once by all the workers. Limits are kept
+# in the cache, so they are shared by the workers only if the cache is. Empty rate or zero disables the limit.
+# Pupils of a school often share one address behind NAT, so the client rate has to be above the school rate
+SUBMIT_SCHOOL_RATE = env.str('SUBMIT_SCHOOL_RATE')
+SUBMIT_CLIENT_RATE = env.str('SUBMIT_CLIENT_RATE')
+SUBMIT_MAX_CONCURRENT = env.int('SUBMIT_MAX_CONCURRENT')
+
 REST_FRAMEWORK = {
+    # number of reverse proxies in front of the app, whose X-Forwarded-For entries identify the client.
+    # With 0 the header is ignored, as it can be set by anyone
+    'NUM_PROXIES': env.int('NUM_PROXIES'),
     'DEFAULT_RENDERER_CLASSES': [
-        'rest_framework.renderers.JSONRenderer',
-    ]
+        'assignments.renderers.ORJSONRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'assignments.parsers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
 }
 
 DEFAULT_AUTO_FIELD='django.db.models.AutoField'